@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+# Compare request throughput when database calls block the event loop
+# (the old situation) with the same calls going through AsyncDatabase.
+#
+# Without --data-path a simulated query (time.sleep) is used, with
+# --data-path and --token real token lookups are done against MySQL.
+
+import argparse
+import asyncio
+import pathlib
+import time
+
+from gmh_registration_service.async_database import AsyncDatabase
+
+
+class SimulatedDatabase:
+    def __init__(self, query_time):
+        self.query_time = query_time
+
+    def get_user_by_token(self, token):
+        time.sleep(self.query_time)
+        return dict(registrant_groupid="benchmark")
+
+
+async def run_blocking(database, token, requests, concurrency):
+    async def request():
+        database.get_user_by_token(token)
+
+    return await _run(request, requests, concurrency)
+
+
+async def run_async(database, token, requests, concurrency, workers):
+    adb = AsyncDatabase(database, max_workers=workers)
+    try:
+
+        async def request():
+            await adb.get_user_by_token(token)
+
+        return await _run(request, requests, concurrency)
+    finally:
+        adb.shutdown()
+
+
+async def _run(request, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            await request()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(requests)))
+    return requests / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark blocking vs. AsyncDatabase throughput"
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=5)
+    parser.add_argument("--query-time", type=float, default=0.005)
+    parser.add_argument("--data-path", type=pathlib.Path)
+    parser.add_argument("--token", default="BENCHMARK")
+    args = parser.parse_args()
+
+    if args.data_path:
+        from gmh_registration_service.cache import TTLCache
+        from gmh_registration_service.config import Config
+        from gmh_registration_service.database import create_database
+
+        config = Config(args.data_path, False)
+        database = create_database(config, token_cache=TTLCache(maxsize=0))
+    else:
+        database = SimulatedDatabase(args.query_time)
+
+    blocking = asyncio.run(
+        run_blocking(database, args.token, args.requests, args.concurrency)
+    )
+    non_blocking = asyncio.run(
+        run_async(database, args.token, args.requests, args.concurrency, args.workers)
+    )
+    print(f"blocking calls:  {blocking:8.1f} req/s")
+    print(f"AsyncDatabase:   {non_blocking:8.1f} req/s ({args.workers} workers)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import asyncio
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncDatabase:
+    """Awaitable facade for Database.
+
+    Every method call is run on a bounded thread pool, so a slow query no
+    longer blocks the event loop. Size the pool to the number of database
+    connections; more threads would only queue up for a connection."""
+
+    def __init__(self, database, max_workers, histogram=None):
+        self.database = database
+        self.histogram = histogram
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="database"
+        )
+
+    def __getattr__(self, name):
+        attribute = getattr(self.database, name)
+        if not callable(attribute):
+            return attribute
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                if self.histogram is not None:
+                    self.histogram.observe(time.perf_counter() - t0, method=name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, lambda: timed(*args, **kwargs)
+            )
+
+        return call
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
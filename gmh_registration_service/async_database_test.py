@@ -0,0 +1,62 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import asyncio
+import threading
+import time
+
+from .async_database import AsyncDatabase
+
+
+class SlowDatabase:
+    name = "slow"
+
+    def __init__(self):
+        self.threads = set()
+
+    def query(self, seconds, value=None):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(seconds)
+        return value
+
+
+async def test_calls_run_concurrently():
+    database = SlowDatabase()
+    adb = AsyncDatabase(database, max_workers=4)
+    try:
+        t0 = time.monotonic()
+        results = await asyncio.gather(*(adb.query(0.1, value=i) for i in range(4)))
+        assert time.monotonic() - t0 < 0.3
+        assert results == [0, 1, 2, 3]
+        assert all(name.startswith("database") for name in database.threads)
+    finally:
+        adb.shutdown()
+
+
+async def test_attributes_pass_through():
+    adb = AsyncDatabase(SlowDatabase(), max_workers=1)
+    assert adb.name == "slow"
+    adb.shutdown()
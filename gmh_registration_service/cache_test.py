@@ -0,0 +1,74 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from .cache import TTLCache
+from .test_utils import Clock
+
+
+def test_get_and_set():
+    cache = TTLCache(maxsize=2, ttl=10)
+    assert cache.get("token") is None
+    cache.set("token", {"registrant_id": 1})
+    assert cache.get("token") == {"registrant_id": 1}
+    assert cache.stats() == dict(size=1, maxsize=2, hits=1, misses=1)
+
+
+def test_expires():
+    clock = Clock()
+    cache = TTLCache(maxsize=2, ttl=10, timer=clock)
+    cache.set("token", "user")
+    clock.now = 9
+    assert cache.get("token") == "user"
+    clock.now = 10
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_invalidate():
+    cache = TTLCache()
+    cache.set("a", dict(credentials_id=1))
+    cache.set("b", dict(credentials_id=2))
+    cache.discard_if(lambda _, user: user["credentials_id"] == 1)
+    assert cache.get("a") is None
+    assert cache.pop("b") == dict(credentials_id=2)
+    assert len(cache) == 0
+
+
+def test_disabled():
+    cache = TTLCache(maxsize=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
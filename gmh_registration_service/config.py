@@ -43,10 +43,90 @@ class Config:
         config = json.loads(cp.read_text()) if cp.is_file() else {}
         self.development = development
         self.deproxy_ips = config.get("deproxy_ips", [])
+        self.token_cache = config.get("token_cache", {})
+        self.invalid_token_cache = config.get(
+            "invalid_token_cache", {"maxsize": 10000, "ttl": 30}
+        )
+        self.auth_throttle = config.get("auth_throttle", {"rate": 0.5, "burst": 20})
+        self.registrant_limits = config.get("registrant_limits", {})
+        # Per registrant_groupid series on the unauthenticated /metrics
+        self.registrant_metrics = config.get("registrant_metrics", False)
+        self.location_cache = config.get("location_cache", {"ttl": 60})
+        self.database_pool = config.get("database_pool", {})
+        self.max_batch_size = config.get("max_batch_size", 10000)
+        self.stream_batch_size = config.get("stream_batch_size", 1000)
+        self.max_page_size = config.get("max_page_size", 10000)
+        self.password_hasher = config.get("password_hasher", {})
+        self.retry_after = config.get("retry_after", 1)
+        self.signed_tokens = config.get("signed_tokens")
+        self.slow_query_log = {"explain": development} | config.get(
+            "slow_query_log", {}
+        )
+        self.lifespan = config.get("lifespan", {})
+        self.jobs = dict(path=data_path / "jobs") | config.get("jobs", {})
+        self.registrant_refresh_interval = config.get(
+            "registrant_refresh_interval", 300
+        )
 
-        self.database_config = self._read_database_config()
+        database = config.get("database", {})
+        self.database_backend = database.get("backend", "mysql")
+        self.read_your_writes = database.get("read_your_writes", 5)
+        self.worker_cache_ttl = config.get("worker_cache_ttl", 5)
+        self.replica_config = None
+        if self.database_backend == "sqlite":
+            self.database_config = dict(
+                path=data_path / database.get("path", "gmh.sqlite"),
+                read_only=database.get("read_only", False),
+            )
+        else:
+            self.database_config = self._read_database_config()
+            if (self.config_path / "database_replica.conf").is_file():
+                self.replica_config = self._read_database_config(
+                    "database_replica.conf"
+                )
 
-    def _read_database_config(self):
+    def share_between_workers(self, workers):
+        """Adapts the per-process settings for `workers` worker processes
+        that serve the same database.
+
+        A worker only invalidates its own caches, so another worker keeps
+        accepting a replaced token or serving removed locations until the
+        entry expires: the TTL of the token and location caches is capped
+        at worker_cache_ttl seconds.
+
+        Every worker has its own registrant limit buckets, so their rates
+        are divided by the number of workers to keep the configured budget
+        for the service as a whole. The burst stays, so that a request that
+        fits the configured burst fits in a single worker; /metrics shows
+        the buckets of the worker that served the scrape.
+
+        Not covered by this: read-your-writes only holds for reads served by
+        the worker that wrote, a signed token revoked on one worker stays
+        valid on the others until it expires, and the auth throttle applies
+        per worker."""
+        for name in ("token_cache", "invalid_token_cache", "location_cache"):
+            cache = getattr(self, name)
+            ttl = min(cache.get("ttl", 300), self.worker_cache_ttl)
+            setattr(self, name, cache | {"ttl": ttl})
+
+        def per_worker(settings):
+            return settings | {"rate": settings.get("rate", 1.0) / workers}
+
+        limits = self.registrant_limits
+        self.registrant_limits = limits | {
+            access: per_worker(limits[access])
+            for access in ("read", "write")
+            if limits.get(access)
+        }
+        if limits.get("groups"):
+            self.registrant_limits["groups"] = {
+                groupid: {
+                    access: per_worker(settings) for access, settings in group.items()
+                }
+                for groupid, group in limits["groups"].items()
+            }
+
+    def _read_database_config(self, filename="database.conf"):
         cp = ConfigParser()
-        cp.read(self.config_path / "database.conf")
+        cp.read(self.config_path / filename)
         return dict(cp.items("client"))
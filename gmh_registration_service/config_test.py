@@ -0,0 +1,55 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import json
+
+from .config import Config
+
+
+def test_share_between_workers(tmp_path):
+    (tmp_path / "config").mkdir()
+    (tmp_path / "config" / "config.json").write_text(
+        json.dumps(
+            dict(
+                database=dict(backend="sqlite"),
+                token_cache=dict(maxsize=10, ttl=300),
+                location_cache=dict(ttl=2),
+                registrant_limits=dict(
+                    write=dict(rate=8, burst=100),
+                    groups=dict(bulk=dict(read=dict(burst=10))),
+                ),
+            )
+        )
+    )
+    config = Config(tmp_path, development=False)
+    config.share_between_workers(4)
+    assert config.token_cache == dict(maxsize=10, ttl=5)
+    assert config.invalid_token_cache == dict(maxsize=10000, ttl=5)
+    assert config.location_cache == dict(ttl=2)
+    assert config.registrant_limits == dict(
+        write=dict(rate=2, burst=100),
+        groups=dict(bulk=dict(read=dict(rate=0.25, burst=10))),
+    )
@@ -24,35 +24,205 @@
 #
 ## end license ##
 
-from mysql.connector.pooling import MySQLConnectionPool
+import mysql.connector
 
 from contextlib import contextmanager
+from .cache import TTLCache
+from .pool import ConnectionPool
+from .registrants import RegistrantIndex
+from .slow_queries import SlowQueryLog
 from .utils import unfragment
 
-import bcrypt
+import hashlib
 
 import gmh_common.database
 
 
+def _chunks(values, size=1000):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def location_hash(location):
+    return hashlib.sha256(location.encode("utf-8")).hexdigest()
+
+
 class Database(gmh_common.database.Database):
-    def get_user_by_token(self, token):
-        result = self.select_query(
-            ["R.prefix", "R.isLTP", "R.registrant_id", "R.registrant_groupid"],
-            from_stmt="registrant R inner join credentials C ON R.registrant_id = C.registrant_id",
-            where_stmt="C.token = %(token)s",
-            values=dict(token=token),
+    def __init__(
+        self,
+        token_cache=None,
+        invalid_token_cache=None,
+        location_cache=None,
+        pool=None,
+        token_signer=None,
+        slow_query_log=None,
+        replica=None,
+        read_your_writes=5,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self._setup(
+            lambda: mysql.connector.connect(**kwargs),
+            token_cache=token_cache,
+            invalid_token_cache=invalid_token_cache,
+            location_cache=location_cache,
+            pool=pool,
+            token_signer=token_signer,
+            slow_query_log=slow_query_log,
+            replica=replica,
+            read_your_writes=read_your_writes,
+        )
+
+    def _setup(
+        self,
+        connect,
+        token_cache=None,
+        invalid_token_cache=None,
+        location_cache=None,
+        pool=None,
+        token_signer=None,
+        slow_query_log=None,
+        replica=None,
+        read_your_writes=5,
+    ):
+        self.token_signer = token_signer
+        # Read-only lookups go to the replica (a Database without caches) if
+        # given. Identifiers written during the last `read_your_writes`
+        # seconds are read from the primary, the replica may lag behind.
+        self.replica = replica
+        self._recent_writes = TTLCache(maxsize=100000, ttl=read_your_writes)
+        self.slow_query_log = (
+            SlowQueryLog() if slow_query_log is None else slow_query_log
+        )
+        self.pool = ConnectionPool(connect, **(pool or {}))
+        self.token_cache = TTLCache() if token_cache is None else token_cache
+        # Unknown tokens, so retries with a stale token do not hit the database
+        self.invalid_token_cache = (
+            TTLCache(maxsize=10000, ttl=30)
+            if invalid_token_cache is None
+            else invalid_token_cache
+        )
+        self.location_cache = (
+            TTLCache(ttl=60) if location_cache is None else location_cache
+        )
+        self._location_generation = 0
+        self._has_location_hash = None
+        self.registrants = RegistrantIndex(self._select_registrants)
+
+    def clear_caches(self):
+        self.token_cache.clear()
+        self.invalid_token_cache.clear()
+        self.location_cache.clear()
+        self.registrants.clear()
+
+    def _invalidate_locations(self, identifiers):
+        self._location_generation += 1
+        for identifier in identifiers:
+            self.location_cache.pop(unfragment(identifier))
+            if self.replica is not None:
+                self._recent_writes.set(unfragment(identifier), True)
+
+    def _reader(self, *identifiers):
+        """Returns the Database to read identifiers from: the replica,
+        unless there is none or one of identifiers was just written."""
+        if self.replica is None or any(
+            self._recent_writes.get(unfragment(each)) for each in identifiers
+        ):
+            return self
+        return self.replica
+
+    def _select_registrants(self):
+        return self.select_query(
+            [
+                "R.registrant_id",
+                "R.registrant_groupid",
+                "R.prefix",
+                "C.credentials_id",
+            ],
+            from_stmt="registrant R LEFT JOIN credentials C ON R.registrant_id = C.registrant_id",
+            where_stmt="1 = 1",
+            values={},
             conv=lambda f: f.split(".", 1)[-1],
         )
 
+    @contextmanager
+    def cursor(self):
+        with self.pool.connection() as connection:
+            cursor = connection.cursor(buffered=True)
+            try:
+                yield self.slow_query_log.wrap(connection, cursor)
+                connection.commit()
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def transaction(self):
+        with self.cursor() as cursor:
+            cursor.execute("START TRANSACTION")
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+
+    def get_user_by_token(self, token):
+        if self.token_signer is not None and self.token_signer.is_signed(token):
+            return self.token_signer.verify(token)
+
+        if (user := self.token_cache.get(token)) is not None:
+            return user
+        if self.invalid_token_cache.get(token) is not None:
+            return None
+
+        where_stmt, values = "C.token = %(token)s", dict(token=token)
+        result = self._reader()._select_users(where_stmt, values)
+        if len(result) == 0 and self.replica is not None:
+            # The token may have been issued after the replica caught up
+            result = self._select_users(where_stmt, values)
+
         if len(result) > 1:
             raise RuntimeError("Multiple users with same token!")
 
+        if len(result) == 0:
+            self.invalid_token_cache.set(token, True)
+            return None
+
+        user = result[0]
+        self.token_cache.set(token, user)
+        return user
+
+    def get_user_by_credentials_id(self, credentials_id):
+        result = self._select_users(
+            "C.credentials_id = %(credentials_id)s",
+            dict(credentials_id=credentials_id),
+        )
         return result[0] if len(result) == 1 else None
 
+    def _select_users(self, where_stmt, values):
+        return self.select_query(
+            [
+                "R.prefix",
+                "R.isLTP",
+                "R.registrant_id",
+                "R.registrant_groupid",
+                "C.credentials_id",
+            ],
+            from_stmt="registrant R inner join credentials C ON R.registrant_id = C.registrant_id",
+            where_stmt=where_stmt,
+            values=values,
+            conv=lambda f: f.split(".", 1)[-1],
+        )
+
     def has_ltp_location(self, identifier, org_prefix):
         registrant_id = self.get_registrant_id_by_org_prefix(org_prefix)
 
-        results = self.select_query(
+        results = self._reader(identifier).select_query(
             ["IL.isFailover"],
             from_stmt="identifier_location IL JOIN identifier I ON IL.identifier_id = I.identifier_id JOIN identifier_registrant IR ON I.identifier_id = IR.identifier_id",
             where_stmt="IL.isFailover = %(isFailover)s AND I.identifier_value = %(identifier_value)s AND IR.registrant_id = %(registrant_id)s",
@@ -63,7 +233,96 @@ class Database(gmh_common.database.Database):
 
         return len(results) > 0
 
+    def get_locations_with_ltp_access(self, identifier, registrant_id):
+        """Combines has_ltp_location and get_locations(include_ltp=True) in
+        one round trip. Returns dict(locations=[...], has_ltp=bool).
+
+        Results are cached per identifier (and registrant) until one of the
+        write methods invalidates them."""
+        identifier = unfragment(identifier)
+        cached = self.location_cache.get(identifier) or {}
+        if (result := cached.get(registrant_id)) is not None:
+            return result
+
+        generation = self._location_generation
+        rows = self._reader(identifier).select_query(
+            [
+                "L.location_url",
+                "IL.isFailover",
+                "EXISTS (SELECT 1 FROM identifier_location LTP JOIN identifier_registrant IR ON LTP.identifier_id = IR.identifier_id WHERE LTP.identifier_id = I.identifier_id AND LTP.isFailover = 1 AND IR.registrant_id = %(registrant_id)s)",
+            ],
+            from_stmt="identifier I JOIN identifier_location IL ON I.identifier_id = IL.identifier_id JOIN location L ON L.location_id = IL.location_id",
+            where_stmt="I.identifier_value = %(identifier)s ORDER BY IL.location_id",
+            values=dict(identifier=identifier, registrant_id=registrant_id),
+            target_fields=["uri", "ltp", "has_ltp"],
+        )
+        result = dict(
+            locations=[dict(uri=row["uri"], ltp=row["ltp"]) for row in rows],
+            has_ltp=any(row["has_ltp"] for row in rows),
+        )
+        # Do not cache what a concurrent write may already have changed
+        if generation == self._location_generation:
+            self.location_cache.set(identifier, {**cached, registrant_id: result})
+        return result
+
+    def get_ltp_identifiers(self, identifiers, registrant_id):
+        """Returns the identifiers for which registrant_id has registered LTP locations."""
+        ltp_identifiers = set()
+        reader = self._reader(*identifiers)
+        for chunk in _chunks(unfragment(each) for each in identifiers):
+            ltp_identifiers.update(
+                row["identifier_value"]
+                for row in reader.select_query(
+                    ["DISTINCT I.identifier_value"],
+                    from_stmt="identifier_location IL JOIN identifier I ON IL.identifier_id = I.identifier_id JOIN identifier_registrant IR ON I.identifier_id = IR.identifier_id",
+                    where_stmt=f"IL.isFailover = 1 AND IR.registrant_id = %s AND I.identifier_value IN ({_placeholders(chunk)})",
+                    values=[registrant_id, *chunk],
+                    target_fields=["identifier_value"],
+                )
+            )
+        return ltp_identifiers
+
+    def get_registrant_identifiers(self, registrant_id, after=0, limit=1000):
+        """Returns the identifiers of registrant_id with an identifier_id
+        above `after`, in order, as dict(identifier_id, identifier). Keyset
+        pagination: every page is a range scan of the registrant's index,
+        however deep it is."""
+        with self._reader().cursor() as cursor:
+            cursor.execute(
+                "SELECT IR.identifier_id, I.identifier_value FROM identifier_registrant IR JOIN identifier I ON I.identifier_id = IR.identifier_id WHERE IR.registrant_id = %(registrant_id)s AND IR.identifier_id > %(after)s ORDER BY IR.identifier_id LIMIT %(limit)s",
+                dict(registrant_id=registrant_id, after=after, limit=limit),
+            )
+            return [
+                dict(identifier_id=identifier_id, identifier=identifier)
+                for identifier_id, identifier in cursor
+            ]
+
+    def get_locations_by_identifiers(self, identifiers, include_ltp):
+        """Returns {identifier: [{"uri": ..., "ltp": ...}, ...]} for all
+        identifiers that have locations, fetched with one query per 1000."""
+        result = {}
+        reader = self._reader(*identifiers)
+        for chunk in _chunks(dict.fromkeys(unfragment(each) for each in identifiers)):
+            for row in reader.select_query(
+                ["I.identifier_value", "L.location_url", "IL.isFailover"],
+                from_stmt="identifier I JOIN identifier_location IL ON I.identifier_id = IL.identifier_id JOIN location L ON L.location_id = IL.location_id",
+                where_stmt=f"I.identifier_value IN ({_placeholders(chunk)})"
+                + ("" if include_ltp else " AND IL.isFailover = 0")
+                + " ORDER BY IL.identifier_id, IL.location_id",
+                values=chunk,
+                target_fields=["identifier_value", "uri", "ltp"],
+            ):
+                result.setdefault(row["identifier_value"], []).append(
+                    dict(uri=row["uri"], ltp=row["ltp"])
+                )
+        return result
+
     def get_registrant_id_by_org_prefix(self, org_prefix):
+        if (
+            registrant_id := self.registrants.registrant_id_by_prefix(org_prefix)
+        ) is not None:
+            return registrant_id
+
         registrant_id = 0
         result = self.select_query(
             ["registrant_id"],
@@ -74,10 +333,16 @@ class Database(gmh_common.database.Database):
 
         if len(result) > 0:
             registrant_id = result[0]["registrant_id"]
+            self.registrants.request_refresh()
 
         return registrant_id
 
     def get_registrant_id_by_groupid(self, groupid):
+        if (
+            registrant_id := self.registrants.registrant_id_by_groupid(groupid)
+        ) is not None:
+            return registrant_id
+
         registrant_id = None
         result = self.select_query(
             ["registrant_id"],
@@ -88,10 +353,18 @@ class Database(gmh_common.database.Database):
 
         if len(result) > 0:
             registrant_id = result[0]["registrant_id"]
+            self.registrants.request_refresh()
 
         return registrant_id
 
     def get_credentials_by_registrant_id(self, registrant_id):
+        if (
+            credentials_id := self.registrants.credentials_id_by_registrant_id(
+                registrant_id
+            )
+        ) is not None:
+            return credentials_id
+
         response = None
         result = self.select_query(
             ["credentials_id"],
@@ -102,6 +375,7 @@ class Database(gmh_common.database.Database):
 
         if len(result) > 0:
             response = result[0]["credentials_id"]
+            self.registrants.request_refresh()
 
         return response
 
@@ -119,39 +393,332 @@ class Database(gmh_common.database.Database):
             > 0
         )
 
-    def add_nbn_locations(self, identifier, locations, user):
-        return super().add_nbn_locations(
-            identifier,
-            locations,
-            registrant_id=user["registrant_id"],
-            isLTP=user["isLTP"],
+    def get_resolvable_identifiers(self, identifiers):
+        resolvable = set()
+        for chunk in _chunks(unfragment(each) for each in identifiers):
+            resolvable.update(
+                row["identifier_value"]
+                for row in self.select_query(
+                    ["DISTINCT I.identifier_value"],
+                    from_stmt="identifier I INNER JOIN identifier_location IL ON I.identifier_id=IL.identifier_id",
+                    where_stmt=f"I.identifier_value IN ({_placeholders(chunk)})",
+                    values=chunk,
+                    target_fields=["identifier_value"],
+                )
+            )
+        return resolvable
+
+    def add_nbn_locations_batch(self, items, user):
+        """Registers many (identifier, locations) pairs in one transaction,
+        using multi-row INSERTs for each of the tables involved."""
+        items = [(unfragment(identifier), locations) for identifier, locations in items]
+        with self.transaction() as cursor:
+            identifier_ids = self._ensure_values(
+                cursor,
+                "identifier",
+                "identifier_id",
+                "identifier_value",
+                [identifier for identifier, _ in items],
+                nocase=True,
+            )
+            self._link_locations(
+                cursor,
+                [
+                    (identifier_ids[identifier], locations)
+                    for identifier, locations in items
+                ],
+                user["isLTP"],
+            )
+            self._link_registrant(
+                cursor, user["registrant_id"], set(identifier_ids.values())
+            )
+        self._invalidate_locations(identifier for identifier, _ in items)
+
+    def import_nbn_locations(self, items, user):
+        """Registers many (identifier, locations) pairs like
+        add_nbn_locations_batch, but set-based: the pairs are loaded into a
+        temporary staging table with one multi-row INSERT and merged into
+        the tables with an INSERT ... SELECT each, whatever their number.
+        For bulk imports that are not checked for conflicts row by row."""
+        # Locations are prioritised by their location_id, so new rows are
+        # inserted in the order in which they first occur, as _ensure_values
+        # does
+        rows = [
+            (unfragment(identifier), location, position)
+            for position, (identifier, location) in enumerate(
+                (identifier, location)
+                for identifier, locations in items
+                for location in dict.fromkeys(locations)
+            )
+        ]
+        values = dict(
+            registrant_id=user["registrant_id"], isLTP=int(bool(user["isLTP"]))
+        )
+        # As in get_nbn_by_location, look locations up through the hash index
+        location_join = (
+            "L.location_url_hash = SHA2(S.location_url, 256) AND L.location_url = S.location_url"
+            if self.has_location_hash()
+            else "L.location_url = S.location_url"
+        )
+        with self.transaction() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS `import_staging` (`identifier_value` VARCHAR(255) NOT NULL, `location_url` VARCHAR(2048) NOT NULL, `position` INT NOT NULL)"
+            )
+            cursor.execute("DELETE FROM `import_staging`")
+            cursor.executemany(
+                "INSERT INTO `import_staging` (`identifier_value`, `location_url`, `position`) VALUES (%s, %s, %s)",
+                rows,
+            )
+            cursor.execute(
+                "INSERT INTO `identifier` (`identifier_value`) SELECT S.identifier_value FROM import_staging S LEFT JOIN identifier I ON I.identifier_value = S.identifier_value WHERE I.identifier_id IS NULL GROUP BY S.identifier_value ORDER BY MIN(S.position)"
+            )
+            cursor.execute(
+                f"INSERT INTO `location` (`location_url`) SELECT S.location_url FROM import_staging S LEFT JOIN location L ON {location_join} WHERE L.location_id IS NULL GROUP BY S.location_url ORDER BY MIN(S.position)"
+            )
+            cursor.execute(
+                f"INSERT INTO `identifier_location` (`identifier_id`, `location_id`, `isFailover`) SELECT I.identifier_id, L.location_id, %(isLTP)s FROM import_staging S JOIN identifier I ON I.identifier_value = S.identifier_value JOIN location L ON {location_join} ORDER BY S.position",
+                values,
+            )
+            cursor.execute(
+                "INSERT INTO `identifier_registrant` (`registrant_id`, `identifier_id`) SELECT DISTINCT %(registrant_id)s, I.identifier_id FROM import_staging S JOIN identifier I ON I.identifier_value = S.identifier_value LEFT JOIN identifier_registrant IR ON IR.identifier_id = I.identifier_id AND IR.registrant_id = %(registrant_id)s WHERE IR.identifier_id IS NULL",
+                values,
+            )
+            cursor.execute("DELETE FROM `import_staging`")
+        self._invalidate_locations(identifier for identifier, _, _ in rows)
+
+    def update_nbn_locations(self, identifier, locations, user):
+        """Replaces the user's (LTP or non-LTP) locations of identifier in one
+        transaction, writing only what differs from the stored locations.
+
+        Locations are read back in location_id order, and a location that
+        exists already keeps its (lower) id, so the stored order cannot be
+        compared with the submitted one; the links are diffed as sets.
+        Returns True if the identifier was resolvable."""
+        identifier = unfragment(identifier)
+        locations = list(dict.fromkeys(locations))
+        isLTP = int(bool(user["isLTP"]))
+
+        with self.transaction() as cursor:
+            identifier_id = self._ensure_values(
+                cursor,
+                "identifier",
+                "identifier_id",
+                "identifier_value",
+                [identifier],
+                nocase=True,
+            )[identifier]
+            cursor.execute(
+                "SELECT IL.location_id, L.location_url, IL.isFailover FROM identifier_location IL JOIN location L ON L.location_id = IL.location_id WHERE IL.identifier_id = %s ORDER BY IL.location_id FOR UPDATE",
+                [identifier_id],
+            )
+            stored = cursor.fetchall()
+            own = {
+                url: location_id
+                for (location_id, url, isFailover) in stored
+                if int(isFailover) == isLTP
+            }
+
+            if obsolete := [
+                location_id for url, location_id in own.items() if url not in locations
+            ]:
+                cursor.execute(
+                    f"DELETE FROM `identifier_location` WHERE `identifier_id` = %s AND `isFailover` = %s AND `location_id` IN ({_placeholders(obsolete)})",
+                    [identifier_id, isLTP, *obsolete],
+                )
+            self._link_locations(
+                cursor,
+                [(identifier_id, [url for url in locations if url not in own])],
+                isLTP,
+            )
+            self._link_registrant(cursor, user["registrant_id"], [identifier_id])
+
+        self._invalidate_locations([identifier])
+        return len(stored) > 0
+
+    def _link_locations(self, cursor, identifier_locations, isLTP):
+        location_ids = self._ensure_values(
+            cursor,
+            "location",
+            "location_id",
+            "location_url",
+            [
+                location
+                for _, locations in identifier_locations
+                for location in locations
+            ],
+        )
+        cursor.executemany(
+            "INSERT INTO `identifier_location` (`identifier_id`, `location_id`, `isFailover`) VALUES (%s, %s, %s)",
+            [
+                (identifier_id, location_ids[location], isLTP)
+                for identifier_id, locations in identifier_locations
+                for location in dict.fromkeys(locations)
+            ],
         )
 
-    def delete_nbn_locations(self, identifier, user):
-        return super().delete_nbn_locations(
-            identifier,
-            registrant_id=user["registrant_id"],
-            isLTP=user["isLTP"],
+    def _link_registrant(self, cursor, registrant_id, identifier_ids):
+        registered = set()
+        for chunk in _chunks(identifier_ids):
+            cursor.execute(
+                f"SELECT `identifier_id` FROM `identifier_registrant` WHERE `registrant_id` = %s AND `identifier_id` IN ({_placeholders(chunk)})",
+                [registrant_id, *chunk],
+            )
+            registered.update(identifier_id for (identifier_id,) in cursor)
+        cursor.executemany(
+            "INSERT INTO `identifier_registrant` (`registrant_id`, `identifier_id`) VALUES (%s, %s)",
+            [
+                (registrant_id, identifier_id)
+                for identifier_id in set(identifier_ids) - registered
+            ],
         )
 
+    def _ensure_values(
+        self, cursor, table, id_column, value_column, values, nocase=False
+    ):
+        """Returns {value: id} for values, inserting the rows that are missing.
+
+        With nocase the column has a case-insensitive collation: a row then
+        matches all values that differ from it in case only, and of those
+        values only the first is inserted."""
+        values = list(dict.fromkeys(values))
+        key = str.casefold if nocase else str
+
+        def select(values):
+            ids = {}
+            for chunk in _chunks(values):
+                cursor.execute(
+                    f"SELECT `{value_column}`, `{id_column}` FROM `{table}` WHERE `{value_column}` IN ({_placeholders(chunk)})",
+                    chunk,
+                )
+                found = {key(value): id_ for (value, id_) in cursor}
+                ids.update(
+                    (value, found[key(value)]) for value in chunk if key(value) in found
+                )
+            return ids
+
+        ids = select(values)
+        if missing := [value for value in values if value not in ids]:
+            first = {}
+            for value in missing:
+                first.setdefault(key(value), value)
+            cursor.executemany(
+                f"INSERT INTO `{table}` (`{value_column}`) VALUES (%s)",
+                [(value,) for value in first.values()],
+            )
+            ids.update(select(missing))
+        return ids
+
+    def add_nbn_locations(self, identifier, locations, user):
+        try:
+            return super().add_nbn_locations(
+                identifier,
+                locations,
+                registrant_id=user["registrant_id"],
+                isLTP=user["isLTP"],
+            )
+        finally:
+            self._invalidate_locations([identifier])
+
+    def delete_nbn_locations(self, identifier, user):
+        try:
+            return super().delete_nbn_locations(
+                identifier,
+                registrant_id=user["registrant_id"],
+                isLTP=user["isLTP"],
+            )
+        finally:
+            self._invalidate_locations([identifier])
+
+    def get_locations(self, identifier, include_ltp):
+        return self._reader(identifier)._get_locations(identifier, include_ltp)
+
+    def _get_locations(self, identifier, include_ltp):
+        return super().get_locations(identifier, include_ltp)
+
     def get_nbn_by_location(self, location):
-        return self.select_query(
+        reader = self._reader()
+        # Find candidates through the fixed-width hash index, then confirm
+        # the exact url.
+        where_stmt = (
+            "L.location_url_hash = %(hash)s AND L.location_url = %(location)s;"
+            if reader.has_location_hash()
+            else "L.location_url = %(location)s;"
+        )
+        return reader.select_query(
             ["I.identifier_value"],
             "identifier I JOIN identifier_location IL ON I.identifier_id = IL.identifier_id JOIN location L ON L.location_id = IL.location_id",
-            "L.location_url = %(location)s;",
-            dict(location=location),
+            where_stmt,
+            dict(location=location, hash=location_hash(location)),
             target_fields=["identifier_value"],
         )
 
+    def has_location_hash(self):
+        if self._has_location_hash is None:
+            self._has_location_hash = (
+                len(
+                    self.select_query(
+                        ["COLUMN_NAME"],
+                        from_stmt="information_schema.COLUMNS",
+                        where_stmt="TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'location' AND COLUMN_NAME = 'location_url_hash'",
+                        values={},
+                    )
+                )
+                > 0
+            )
+        return self._has_location_hash
+
+    def add_location_hash(self):
+        """Adds location.location_url_hash, the SHA-256 of location_url, with
+        an index. As a stored generated column MySQL fills it for the existing
+        rows (the backfill) and keeps it up to date for new ones."""
+        if self.has_location_hash():
+            return False
+        self.execute_statements(
+            [
+                "ALTER TABLE `location` ADD COLUMN `location_url_hash` CHAR(64) AS (SHA2(`location_url`, 256)) STORED, ADD INDEX `location_url_hash` (`location_url_hash`)"
+            ]
+        )
+        self._has_location_hash = True
+        return True
+
+    def has_registrant_index(self):
+        return (
+            len(
+                self.select_query(
+                    ["S1.INDEX_NAME"],
+                    from_stmt="information_schema.STATISTICS S1 JOIN information_schema.STATISTICS S2 ON S1.TABLE_SCHEMA = S2.TABLE_SCHEMA AND S1.TABLE_NAME = S2.TABLE_NAME AND S1.INDEX_NAME = S2.INDEX_NAME",
+                    where_stmt="S1.TABLE_SCHEMA = DATABASE() AND S1.TABLE_NAME = 'identifier_registrant' AND S1.COLUMN_NAME = 'registrant_id' AND S1.SEQ_IN_INDEX = 1 AND S2.COLUMN_NAME = 'identifier_id' AND S2.SEQ_IN_INDEX = 2",
+                    values={},
+                )
+            )
+            > 0
+        )
+
+    def add_registrant_index(self):
+        """Adds the (registrant_id, identifier_id) index that the keyset
+        pagination of get_registrant_identifiers scans."""
+        if self.has_registrant_index():
+            return False
+        self.execute_statements(
+            [
+                "ALTER TABLE `identifier_registrant` ADD INDEX `identifier_registrant_registrant` (`registrant_id`, `identifier_id`)"
+            ]
+        )
+        return True
+
     def update_token(self, token, credentials_id):
         with self.cursor() as cursor:
             cursor.execute(
                 "UPDATE `credentials` SET `token`=%(token)s WHERE `credentials_id` = %(credentials_id)s",
                 dict(token=token, credentials_id=credentials_id),
             )
+        self.invalid_token_cache.pop(token)
+        self.token_cache.discard_if(
+            lambda _, user: user["credentials_id"] == credentials_id
+        )
 
-    def validate_user_credentials(self, username, password):
-        if username is None or password is None:
+    def get_credentials_by_username(self, username):
+        if username is None:
             return None
 
         matching_credentials = self.select_query(
@@ -163,23 +730,12 @@ class Database(gmh_common.database.Database):
         if len(matching_credentials) != 1:
             return None
 
-        credentials = matching_credentials[0]
+        return matching_credentials[0]
 
-        if (
-            bcrypt.checkpw(
-                password.encode("utf-8"), credentials["password"].encode("utf-8")
-            )
-            is False
-        ):
-            return None
-
-        return credentials["credentials_id"]
-
-    def set_password(self, groupid, username, password):
+    def set_password(self, groupid, username, hashed_password):
         if (registrant_id := self.get_registrant_id_by_groupid(groupid)) is None:
             raise RuntimeError(f"Registrant with groupid '{groupid}' not found")
 
-        hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
         if (
             credentials_id := self.get_credentials_by_registrant_id(registrant_id)
         ) is None:
@@ -192,6 +748,7 @@ class Database(gmh_common.database.Database):
                         password=hashed_password,
                     ),
                 )
+            self.registrants.request_refresh()
         else:
             with self.cursor() as cursor:
                 cursor.execute(
@@ -202,3 +759,27 @@ class Database(gmh_common.database.Database):
                         credentials_id=credentials_id,
                     ),
                 )
+
+
+def create_database(config, **kwargs):
+    """Returns the Database for the backend selected in config.json, MySQL
+    (configured in database.conf) unless "database": {"backend": "sqlite"}.
+    A MySQL read replica is configured in database_replica.conf."""
+    if config.database_backend == "sqlite":
+        from .sqlite_database import SQLiteDatabase
+
+        return SQLiteDatabase(**config.database_config, **kwargs)
+
+    if config.replica_config is not None:
+        kwargs.setdefault(
+            "replica",
+            Database(
+                token_cache=TTLCache(maxsize=0),
+                invalid_token_cache=TTLCache(maxsize=0),
+                location_cache=TTLCache(maxsize=0),
+                pool=kwargs.get("pool"),
+                slow_query_log=kwargs.get("slow_query_log"),
+                **config.replica_config,
+            ),
+        )
+    return Database(**kwargs, **config.database_config)
@@ -0,0 +1,84 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import pytest
+
+from .sqlite_database import SQLiteDatabase
+from .sqlite_database_test import NBN, URL, insert_user
+
+
+@pytest.fixture
+def databases(tmp_path):
+    replica = SQLiteDatabase(tmp_path / "replica.sqlite")
+    primary = SQLiteDatabase(tmp_path / "primary.sqlite", replica=replica)
+    yield primary, replica
+    primary.close()
+    replica.close()
+
+
+def test_reads_go_to_replica(databases):
+    primary, replica = databases
+    user = insert_user(replica)
+    replica.add_nbn_locations(NBN, [URL], user)
+
+    assert primary.get_user_by_token("TOKEN") == user
+    assert primary.get_locations(NBN, False) == [dict(uri=URL, ltp=0)]
+    assert primary.get_nbn_by_location(URL) == [dict(identifier_value=NBN)]
+    assert primary.get_locations_by_identifiers([NBN], True) == {
+        NBN: [dict(uri=URL, ltp=0)]
+    }
+    assert primary.get_locations_with_ltp_access(NBN, user["registrant_id"]) == dict(
+        locations=[dict(uri=URL, ltp=0)], has_ltp=False
+    )
+    # Checks before writing are done on the primary
+    assert not primary.is_resolvable_identifier(NBN)
+
+
+def test_token_not_yet_replicated(databases):
+    primary, replica = databases
+    user = insert_user(primary)
+    assert primary.get_user_by_token("TOKEN") == user
+
+
+def test_read_your_writes(databases):
+    primary, replica = databases
+    user = insert_user(primary)
+    primary.add_nbn_locations(NBN, [URL], user)
+
+    assert primary.get_locations(NBN, False) == [dict(uri=URL, ltp=0)]
+    assert primary.get_locations_by_identifiers([NBN, NBN + "-2"], False) == {
+        NBN: [dict(uri=URL, ltp=0)]
+    }
+    assert primary.get_locations(NBN + "-2", False) == []
+
+
+def test_no_replica(tmp_path):
+    database = SQLiteDatabase(tmp_path / "gmh.sqlite")
+    try:
+        assert database.replica is None
+        assert database._reader(NBN) is database
+    finally:
+        database.close()
@@ -0,0 +1,183 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import csv
+import io
+import json
+import os
+import time
+
+from .messages import SUCCESS_CREATED_NEW
+from .utils import (
+    batch_identifiers,
+    check_batch_items,
+    parse_ndjson_line,
+    select_new_items,
+)
+
+FORMATS = ("csv", "ndjson")
+
+
+def guess_format(path):
+    return "csv" if path.suffix.lower() == ".csv" else "ndjson"
+
+
+def read_items(f, format):
+    """Yields (line number, item) from a binary file. A CSV row is an
+    identifier followed by its locations, in order of priority; an NDJSON
+    line is an object as in /nbn/batch. A CSV record spanning lines has
+    the number of its last line."""
+    if format == "ndjson":
+        for line_number, line in enumerate(f, start=1):
+            if line.strip():
+                yield line_number, parse_ndjson_line(line)
+        return
+    reader = csv.reader(io.TextIOWrapper(f, encoding="utf-8", newline=""))
+    for row in reader:
+        if not row or row[0].strip().lower() == "identifier":
+            continue
+        yield reader.line_num, dict(
+            identifier=row[0].strip(),
+            locations=[each.strip() for each in row[1:] if each.strip()],
+        )
+
+
+class Checkpoint:
+    """The progress of an import of `source`, saved to `path` after every
+    chunk, so that a new run continues after the last committed line.
+
+    Before a chunk is committed its new identifiers are saved as `pending`:
+    if the run stops before the line is saved, the next run counts those
+    that are resolvable as imported rather than as conflicts."""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = str(source)
+        self.size = os.path.getsize(source)
+        self.line = 0
+        self.imported = 0
+        self.failed = 0
+        self.done = False
+        self.pending = []
+        if path.exists():
+            state = json.loads(path.read_text())
+            if (state["source"], state["size"]) != (self.source, self.size):
+                raise ValueError(
+                    f"Checkpoint {path} is of {state['source']} ({state['size']} bytes)"
+                )
+            self.line = state["line"]
+            self.imported = state["imported"]
+            self.failed = state["failed"]
+            self.done = state["done"]
+            self.pending = state.get("pending", [])
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(
+            json.dumps(
+                dict(
+                    source=self.source,
+                    size=self.size,
+                    line=self.line,
+                    imported=self.imported,
+                    failed=self.failed,
+                    done=self.done,
+                    pending=self.pending,
+                )
+            )
+        )
+        os.replace(tmp, self.path)
+
+
+def run_import(
+    database,
+    user,
+    source,
+    checkpoint_path,
+    format=None,
+    chunk_size=10000,
+    errors=None,
+    progress=None,
+    timer=time.monotonic,
+):
+    """Imports the identifiers in `source` for `user` in transactions of
+    `chunk_size` items, validated as in /nbn/batch. Rejected items are
+    written to the text file `errors` as NDJSON. Returns the checkpoint.
+
+    progress is called after every chunk with the checkpoint, the number of
+    rows this run has processed and the seconds it took."""
+    checkpoint = Checkpoint(checkpoint_path, source)
+    if checkpoint.done:
+        return checkpoint
+    format = format or guess_format(source)
+    pending = set(checkpoint.pending)
+    rows = 0
+    t0 = timer()
+
+    def import_chunk(chunk):
+        nonlocal pending, rows
+        results, valid = check_batch_items(user, [item for _, item in chunk])
+        resolvable = database.get_resolvable_identifiers(batch_identifiers(valid))
+        to_add = select_new_items(valid, resolvable)
+        # Committed by the previous run, which stopped before saving the line
+        resolvable = {identifier.casefold() for identifier in resolvable}
+        for key in resolvable & pending:
+            valid[key][0].update(status=201, message=SUCCESS_CREATED_NEW)
+        pending -= resolvable
+        if to_add:
+            checkpoint.pending = [identifier.casefold() for identifier, _ in to_add]
+            checkpoint.save()
+            database.import_nbn_locations(to_add, user)
+        for (line_number, _), result in zip(chunk, results):
+            if result["status"] == 201:
+                checkpoint.imported += 1
+            else:
+                checkpoint.failed += 1
+                if errors is not None:
+                    errors.write(json.dumps(dict(line=line_number, **result)) + "\n")
+        if errors is not None:
+            errors.flush()
+        checkpoint.line = chunk[-1][0]
+        checkpoint.pending = []
+        checkpoint.save()
+        rows += len(chunk)
+        if progress is not None:
+            progress(checkpoint, rows, timer() - t0)
+
+    with open(source, "rb") as f:
+        chunk = []
+        for line_number, item in read_items(f, format):
+            if line_number <= checkpoint.line:
+                continue
+            chunk.append((line_number, item))
+            if len(chunk) == chunk_size:
+                import_chunk(chunk)
+                chunk = []
+        if chunk:
+            import_chunk(chunk)
+    checkpoint.done = True
+    checkpoint.save()
+    return checkpoint
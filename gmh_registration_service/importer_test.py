@@ -0,0 +1,162 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import io
+import json
+
+import pytest
+
+from .importer import Checkpoint, read_items, run_import
+from .messages import URN_NBN_CONFLICT, URN_NBN_FORBIDDEN2
+from .sqlite_database_test import NBN, URL, insert_user
+from .test_utils import database
+
+
+def test_read_items():
+    csv = b'identifier,location\n%s-1,%s/1,%s/2\n\n"%s-2", %s/3\n' % (
+        NBN.encode(),
+        URL.encode(),
+        URL.encode(),
+        NBN.encode(),
+        URL.encode(),
+    )
+    assert list(read_items(io.BytesIO(csv), "csv")) == [
+        (2, dict(identifier=f"{NBN}-1", locations=[f"{URL}/1", f"{URL}/2"])),
+        (4, dict(identifier=f"{NBN}-2", locations=[f"{URL}/3"])),
+    ]
+    ndjson = b'{"identifier": "%s", "locations": []}\n\ninvalid\n' % NBN.encode()
+    assert list(read_items(io.BytesIO(ndjson), "ndjson")) == [
+        (1, dict(identifier=NBN, locations=[])),
+        (3, None),
+    ]
+
+
+def test_import(tmp_path, database):
+    user = insert_user(database)
+    database.add_nbn_locations(f"{NBN}-0", [URL], user)
+    source = tmp_path / "import.csv"
+    source.write_text(
+        "".join(
+            [
+                f"{NBN}-0,{URL}\n",
+                f"{NBN}-1,{URL}/1,{URL}\n",
+                f"urn:nbn:nl:ui:43-1,{URL}\n",
+                f"{NBN}-2,{URL}/2\n",
+                f"{NBN}-1,{URL}/3\n",
+                f"{NBN.lower()}-2,{URL}/4\n",
+            ]
+        )
+    )
+    errors = io.StringIO()
+    checkpoint = run_import(
+        database, user, source, tmp_path / "checkpoint", chunk_size=2, errors=errors
+    )
+    assert (checkpoint.imported, checkpoint.failed, checkpoint.done) == (2, 4, True)
+    assert [
+        (each["line"], each["message"])
+        for each in map(json.loads, errors.getvalue().splitlines())
+    ] == [
+        (1, URN_NBN_CONFLICT),
+        (3, URN_NBN_FORBIDDEN2),
+        (5, URN_NBN_CONFLICT),
+        (6, URN_NBN_CONFLICT),
+    ]
+    assert database.get_locations(f"{NBN}-1", False) == [
+        dict(uri=URL, ltp=0),
+        dict(uri=f"{URL}/1", ltp=0),
+    ]
+    assert database.get_locations(f"{NBN}-2", False) == [dict(uri=f"{URL}/2", ltp=0)]
+    assert [
+        row["identifier"]
+        for row in database.get_registrant_identifiers(user["registrant_id"])
+    ] == [f"{NBN}-{n}" for n in range(3)]
+
+    # A finished import is not repeated
+    assert run_import(database, user, source, tmp_path / "checkpoint").imported == 2
+
+
+def test_resume(tmp_path, database):
+    user = insert_user(database)
+    source = tmp_path / "import.ndjson"
+    source.write_text(
+        "".join(
+            json.dumps(dict(identifier=f"{NBN}-{n}", locations=[f"{URL}/{n}"])) + "\n"
+            for n in range(5)
+        )
+    )
+    checkpoint = Checkpoint(tmp_path / "checkpoint", source)
+    checkpoint.line = 3
+    checkpoint.imported = 3
+    checkpoint.save()
+
+    checkpoint = run_import(database, user, source, tmp_path / "checkpoint")
+    assert (checkpoint.line, checkpoint.imported, checkpoint.failed) == (5, 5, 0)
+    assert database.get_resolvable_identifiers([f"{NBN}-{n}" for n in range(5)]) == {
+        f"{NBN}-3",
+        f"{NBN}-4",
+    }
+
+    source.write_text("")
+    with pytest.raises(ValueError):
+        Checkpoint(tmp_path / "checkpoint", source)
+
+
+def test_resume_after_commit(tmp_path, database, monkeypatch):
+    user = insert_user(database)
+    database.add_nbn_locations(f"{NBN}-0", [URL], user)
+    source = tmp_path / "import.ndjson"
+    source.write_text(
+        "".join(
+            json.dumps(dict(identifier=f"{NBN}-{n}", locations=[f"{URL}/{n}"])) + "\n"
+            for n in range(4)
+        )
+    )
+    import_nbn_locations = database.import_nbn_locations
+
+    def interrupted(items, user):
+        # The chunk is committed, but the run stops before saving the line
+        import_nbn_locations(items, user)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(database, "import_nbn_locations", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        run_import(database, user, source, tmp_path / "checkpoint", chunk_size=2)
+    monkeypatch.undo()
+
+    errors = io.StringIO()
+    progress = []
+    checkpoint = run_import(
+        database,
+        user,
+        source,
+        tmp_path / "checkpoint",
+        chunk_size=2,
+        errors=errors,
+        progress=lambda checkpoint, rows, elapsed: progress.append(rows),
+    )
+    assert (checkpoint.imported, checkpoint.failed, checkpoint.pending) == (3, 1, [])
+    assert [json.loads(line)["line"] for line in errors.getvalue().splitlines()] == [1]
+    assert progress == [2, 4]
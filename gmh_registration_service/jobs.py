@@ -0,0 +1,276 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from .messages import SUCCESS_CREATED_NEW
+from .utils import (
+    batch_identifiers,
+    check_batch_items,
+    parse_ndjson_line,
+    select_new_items,
+)
+
+logger = logging.getLogger(__name__)
+
+PENDING = ("queued", "running")
+
+
+class Jobs:
+    """Bulk registrations that are too large for /nbn/batch.
+
+    The uploaded NDJSON is spooled to `path` as `{id}.ndjson`, next to its
+    status in `{id}.json`. A background thread registers the items with
+    `chunk_size` items per transaction, saving the status after each chunk
+    so a job resumes where it was after a restart. Before a chunk is
+    committed its new identifiers are saved as `pending`, so that a chunk
+    committed just before a restart is not reported as conflicts. The input of a job is
+    locked with flock while it is processed, so when several worker
+    processes share `path` every job is processed by one of them. The
+    files of a job are removed `retention` seconds after it finished."""
+
+    def __init__(
+        self,
+        path,
+        database,
+        chunk_size=1000,
+        max_bytes=1 << 30,
+        max_errors=1000,
+        poll_interval=10,
+        retention=7 * 24 * 3600,
+        timer=time.time,
+    ):
+        self.path = path
+        self.database = database
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.max_errors = max_errors
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._timer = timer
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        path.mkdir(parents=True, exist_ok=True)
+
+    def _input_path(self, job_id):
+        return self.path / f"{job_id}.ndjson"
+
+    def _status_path(self, job_id):
+        return self.path / f"{job_id}.json"
+
+    def create(self, user):
+        """Returns the id of a new job for `user`; the caller writes the
+        input with open_input() and then calls submit()."""
+        job_id = uuid.uuid4().hex
+        self._save(
+            dict(
+                id=job_id,
+                registrant_groupid=user["registrant_groupid"],
+                credentials_id=user["credentials_id"],
+                state="receiving",
+                created=self._timer(),
+                started=None,
+                finished=None,
+                line=0,
+                pending=[],
+                processed=0,
+                succeeded=0,
+                failed=0,
+                errors=[],
+            )
+        )
+        return job_id
+
+    def open_input(self, job_id):
+        return self._input_path(job_id).open("wb")
+
+    def submit(self, job_id):
+        status = self.get(job_id)
+        status["state"] = "queued"
+        self._save(status)
+        self._queue.put(job_id)
+
+    def discard(self, job_id):
+        self._input_path(job_id).unlink(missing_ok=True)
+        self._status_path(job_id).unlink(missing_ok=True)
+
+    def get(self, job_id):
+        try:
+            return json.loads(self._status_path(job_id).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, status):
+        path = self._status_path(status["id"])
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(status))
+        os.replace(tmp, path)
+
+    def cleanup(self):
+        """Removes the input and status of the jobs that finished more than
+        `retention` seconds ago."""
+        expired = self._timer() - self.retention
+        for path in self.path.glob("*.json"):
+            status = self.get(path.stem)
+            if (
+                status
+                and status["finished"] is not None
+                and status["finished"] < expired
+            ):
+                self.discard(path.stem)
+
+    def pending(self):
+        for path in sorted(self.path.glob("*.json"), key=os.path.getmtime):
+            if (status := self.get(path.stem)) and status["state"] in PENDING:
+                yield path.stem
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        for job_id in self.pending():
+            self._queue.put(job_id)
+        self._thread = threading.Thread(target=self._run, name="jobs", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops after the chunk being processed; the job resumes on the
+        next start."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        next_cleanup = 0
+        while not self._stop.is_set():
+            if self._timer() >= next_cleanup:
+                try:
+                    self.cleanup()
+                except Exception:
+                    logger.exception("Removing finished jobs failed")
+                next_cleanup = self._timer() + self.poll_interval
+            try:
+                job_id = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                # Picks up jobs left behind by a worker process that died
+                for job_id in self.pending():
+                    self._queue.put(job_id)
+                continue
+            if job_id is None:
+                continue
+            try:
+                self.process(job_id)
+            except Exception:
+                logger.exception(f"Processing job {job_id} failed")
+
+    def process(self, job_id):
+        """Processes job `job_id` unless another process is doing so."""
+        try:
+            f = self._input_path(job_id).open("rb")
+        except FileNotFoundError:
+            return
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            if (status := self.get(job_id)) is None or status["state"] not in PENDING:
+                return
+            try:
+                self._process(status, f)
+            except Exception as e:
+                status.update(state="failed", finished=self._timer(), error=str(e))
+                self._save(status)
+                raise
+
+    def _process(self, status, f):
+        if (
+            user := self.database.get_user_by_credentials_id(status["credentials_id"])
+        ) is None:
+            raise RuntimeError("Credentials of the job no longer exist")
+        if status["started"] is None:
+            status["started"] = self._timer()
+        status["state"] = "running"
+        self._save(status)
+
+        pending = set(status["pending"])
+
+        def process_chunk(chunk):
+            nonlocal pending
+            results, valid = check_batch_items(user, [item for _, item in chunk])
+            resolvable = self.database.get_resolvable_identifiers(
+                batch_identifiers(valid)
+            )
+            to_add = select_new_items(valid, resolvable)
+            # Committed before a restart that came before saving the line
+            resolvable = {identifier.casefold() for identifier in resolvable}
+            for key in resolvable & pending:
+                valid[key][0].update(status=201, message=SUCCESS_CREATED_NEW)
+            pending -= resolvable
+            if to_add:
+                status["pending"] = [identifier.casefold() for identifier, _ in to_add]
+                self._save(status)
+                self.database.add_nbn_locations_batch(to_add, user)
+            for (line_number, _), result in zip(chunk, results):
+                status["processed"] += 1
+                if result["status"] == 201:
+                    status["succeeded"] += 1
+                    continue
+                status["failed"] += 1
+                if len(status["errors"]) < self.max_errors:
+                    status["errors"].append(dict(line=line_number, **result))
+            status["line"] = chunk[-1][0]
+            status["pending"] = []
+            self._save(status)
+
+        chunk = []
+        for line_number, line in enumerate(f, start=1):
+            if line_number <= status["line"] or not line.strip():
+                continue
+            chunk.append((line_number, parse_ndjson_line(line)))
+            if len(chunk) == self.chunk_size:
+                process_chunk(chunk)
+                chunk = []
+                if self._stop.is_set():
+                    return
+        if chunk:
+            process_chunk(chunk)
+        status.update(state="done", finished=self._timer())
+        self._save(status)
+        logger.info(
+            f"Job {status['id']}: {status['succeeded']} registered, {status['failed']} failed"
+        )
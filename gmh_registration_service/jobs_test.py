@@ -0,0 +1,185 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import json
+import time
+
+import pytest
+
+from .jobs import Jobs
+from .sqlite_database_test import NBN, URL, insert_user
+from .test_utils import database
+from .messages import URN_NBN_CONFLICT, URN_NBN_FORBIDDEN2, URN_NBN_LOCATION_INVALID
+
+
+def _submit(jobs, user, lines):
+    job_id = jobs.create(user)
+    with jobs.open_input(job_id) as f:
+        f.write("".join(line + "\n" for line in lines).encode("utf-8"))
+    jobs.submit(job_id)
+    return job_id
+
+
+def _item(identifier, locations=(URL,)):
+    return json.dumps(dict(identifier=identifier, locations=list(locations)))
+
+
+def test_process_job_in_chunks(tmp_path, database):
+    user = insert_user(database)
+    database.add_nbn_locations(f"{NBN}-0", [URL], user)
+    jobs = Jobs(
+        tmp_path / "jobs", database, chunk_size=2, timer=iter(range(100)).__next__
+    )
+
+    transactions = []
+    add_nbn_locations_batch = database.add_nbn_locations_batch
+    database.add_nbn_locations_batch = lambda items, user: (
+        transactions.append(len(items)) or add_nbn_locations_batch(items, user)
+    )
+
+    job_id = _submit(
+        jobs,
+        user,
+        [
+            _item(f"{NBN}-0"),
+            _item(f"{NBN}-1"),
+            "",
+            "not json",
+            _item(f"{NBN}-2"),
+            _item("urn:nbn:nl:ui:43-1"),
+            _item(f"{NBN}-3", ["ftp://x"]),
+            _item(f"{NBN}-4"),
+        ],
+    )
+    assert jobs.get(job_id)["state"] == "queued"
+    assert list(jobs.pending()) == [job_id]
+
+    jobs.process(job_id)
+    status = jobs.get(job_id)
+    assert status["state"] == "done"
+    assert status["processed"] == 7
+    assert status["succeeded"] == 3
+    assert status["failed"] == 4
+    assert [
+        (each["line"], each["status"], each["message"]) for each in status["errors"]
+    ] == [
+        (1, 409, URN_NBN_CONFLICT),
+        (4, 400, URN_NBN_LOCATION_INVALID),
+        (6, 403, URN_NBN_FORBIDDEN2),
+        (7, 400, URN_NBN_LOCATION_INVALID),
+    ]
+    assert transactions == [1, 1, 1]
+    assert database.get_resolvable_identifiers([f"{NBN}-{n}" for n in range(5)]) == {
+        f"{NBN}-{n}" for n in (0, 1, 2, 4)
+    }
+    assert list(jobs.pending()) == []
+
+
+def test_resume_job(tmp_path, database):
+    user = insert_user(database)
+    jobs = Jobs(tmp_path / "jobs", database, chunk_size=1)
+    job_id = _submit(jobs, user, [_item(f"{NBN}-{n}") for n in range(3)])
+
+    # Stopped after the first chunk, e.g. by a shutdown
+    jobs._stop.set()
+    jobs.process(job_id)
+    status = jobs.get(job_id)
+    assert (status["state"], status["processed"], status["line"]) == ("running", 1, 1)
+
+    jobs = Jobs(tmp_path / "jobs", database, chunk_size=1)
+    assert list(jobs.pending()) == [job_id]
+    jobs.process(job_id)
+    status = jobs.get(job_id)
+    assert (status["state"], status["processed"], status["succeeded"]) == ("done", 3, 3)
+
+
+def test_background_thread(tmp_path, database):
+    user = insert_user(database)
+    jobs = Jobs(tmp_path / "jobs", database)
+    jobs.start()
+    try:
+        job_id = _submit(jobs, user, [_item(NBN)])
+        for _ in range(100):
+            if jobs.get(job_id)["state"] == "done":
+                break
+            time.sleep(0.01)
+    finally:
+        jobs.stop()
+    assert jobs.get(job_id)["succeeded"] == 1
+
+
+def test_failed_job(tmp_path, database):
+    user = insert_user(database)
+    jobs = Jobs(tmp_path / "jobs", database)
+    job_id = _submit(jobs, user | dict(credentials_id=12345), [_item(NBN)])
+    with pytest.raises(RuntimeError):
+        jobs.process(job_id)
+    status = jobs.get(job_id)
+    assert status["state"] == "failed"
+    assert status["error"] == "Credentials of the job no longer exist"
+    assert list(jobs.pending()) == []
+
+
+def test_cleanup(tmp_path, database):
+    user = insert_user(database)
+    now = [1000]
+    jobs = Jobs(tmp_path / "jobs", database, retention=100, timer=lambda: now[0])
+    done = _submit(jobs, user, [_item(NBN)])
+    jobs.process(done)
+    queued = _submit(jobs, user, [_item(f"{NBN}-1")])
+
+    now[0] += 100
+    jobs.cleanup()
+    assert jobs.get(done)["state"] == "done"
+
+    now[0] += 1
+    jobs.cleanup()
+    assert jobs.get(done) is None
+    assert not (tmp_path / "jobs" / f"{done}.ndjson").exists()
+    assert jobs.get(queued)["state"] == "queued"
+
+
+def test_resume_after_commit(tmp_path, database):
+    user = insert_user(database)
+    jobs = Jobs(tmp_path / "jobs", database, chunk_size=2)
+    job_id = _submit(jobs, user, [_item(f"{NBN}-{n}") for n in range(3)])
+
+    add_nbn_locations_batch = database.add_nbn_locations_batch
+
+    def interrupted(items, user):
+        # The chunk is committed, but the worker dies before saving the line
+        add_nbn_locations_batch(items, user)
+        raise KeyboardInterrupt
+
+    database.add_nbn_locations_batch = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        jobs.process(job_id)
+    del database.add_nbn_locations_batch
+
+    jobs.process(job_id)
+    status = jobs.get(job_id)
+    assert (status["state"], status["processed"], status["succeeded"]) == ("done", 3, 3)
+    assert (status["errors"], status["pending"]) == ([], [])
@@ -0,0 +1,114 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import asyncio
+import logging
+import time
+
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class Lifespan:
+    """Starlette lifespan of the service.
+
+    On startup the database pools are filled with `warm_up_connections`
+    connections (default: the pool size), the registrant index is loaded
+    and the templates are compiled; only then `ready` becomes True and the
+    background jobs start. On shutdown the jobs stop after their current
+    chunk and database calls still running are finished (at most
+    `shutdown_timeout` seconds) before the pools are closed."""
+
+    def __init__(
+        self,
+        database,
+        async_database,
+        password_hasher,
+        templates=None,
+        jobs=None,
+        warm_up_connections=None,
+        shutdown_timeout=30,
+        registrant_refresh_interval=None,
+    ):
+        self.database = database
+        self.async_database = async_database
+        self.password_hasher = password_hasher
+        self.templates = templates
+        self.jobs = jobs
+        self.warm_up_connections = warm_up_connections
+        self.shutdown_timeout = shutdown_timeout
+        self.registrant_refresh_interval = registrant_refresh_interval
+        self.ready = False
+
+    @asynccontextmanager
+    async def __call__(self, app):
+        await self.startup()
+        try:
+            yield
+        finally:
+            await self.shutdown()
+
+    def _pools(self):
+        yield self.database.pool
+        if self.database.replica is not None:
+            yield self.database.replica.pool
+
+    async def startup(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.warm_up)
+        self.ready = True
+        if self.jobs is not None:
+            self.jobs.start()
+
+    def warm_up(self):
+        t0 = time.perf_counter()
+        connections = sum(
+            pool.warm_up(self.warm_up_connections) for pool in self._pools()
+        )
+        self.database.registrants.refresh()
+        self.database.registrants.start(self.registrant_refresh_interval)
+        if self.templates is not None:
+            env = self.templates.env
+            for name in env.list_templates(extensions=["j2"]):
+                env.get_template(name)
+        logger.info(
+            f"Warmed up in {time.perf_counter() - t0:.3f}s, opened {connections} database connections"
+        )
+
+    async def shutdown(self):
+        self.ready = False
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self):
+        if self.jobs is not None:
+            self.jobs.stop()
+        self.database.registrants.stop()
+        # Waits for the database calls that are still running
+        self.async_database.shutdown(wait=True)
+        for pool in self._pools():
+            pool.close(timeout=self.shutdown_timeout)
+        self.password_hasher.shutdown()
+        logger.info("Shut down")
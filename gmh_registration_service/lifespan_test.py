@@ -0,0 +1,96 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+from .async_database import AsyncDatabase
+from .lifespan import Lifespan
+from .passwords import PasswordHasher
+from .pool import ConnectionPool
+from .registrants import RegistrantIndex
+
+
+class Connection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Database:
+    def __init__(self):
+        self.pool = ConnectionPool(Connection, pool_size=3)
+        self.registrants = RegistrantIndex(
+            lambda: [
+                dict(
+                    registrant_id=1,
+                    registrant_groupid="group",
+                    prefix="urn:nbn:nl:ui:42-",
+                    credentials_id=None,
+                )
+            ]
+        )
+        self.replica = None
+
+
+class Jobs:
+    running = False
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+
+def test_lifespan():
+    database = Database()
+    jobs = Jobs()
+    lifespan = Lifespan(
+        database,
+        AsyncDatabase(database, max_workers=1),
+        PasswordHasher(max_workers=1),
+        jobs=jobs,
+        warm_up_connections=2,
+        registrant_refresh_interval=60,
+    )
+    assert not lifespan.ready
+
+    with TestClient(Starlette(lifespan=lifespan)):
+        assert lifespan.ready
+        assert database.pool.stats()["idle"] == 2
+        assert database.registrants.registrant_id_by_groupid("group") == 1
+        assert database.registrants._thread is not None
+        assert jobs.running
+        connections = [connection for _, connection in database.pool._idle]
+
+    assert not lifespan.ready
+    assert database.pool.closed
+    assert all(connection.closed for connection in connections)
+    assert database.registrants._thread is None
+    assert not jobs.running
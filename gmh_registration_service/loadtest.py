@@ -0,0 +1,317 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+
+import httpx
+
+SCENARIOS = ("token", "create", "update", "get", "get_locations", "lookup", "location")
+DEFAULT_MIX = "token=1,create=2,update=2,get=10,get_locations=3,lookup=2,location=3"
+
+EXPECTED_STATUS = {
+    "token": (200,),
+    "create": (201,),
+    "update": (200, 201),
+    "get": (200, 304),
+    "get_locations": (200, 304),
+    "lookup": (200,),
+    "location": (200,),
+}
+
+
+def parse_mix(mix):
+    """Parses "name=weight,..." into {name: weight}."""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}, choose from {SCENARIOS}")
+        weights[name] = float(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("At least one scenario needs a positive weight")
+    return weights
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """Summarizes [(status, seconds, ok), ...] into counts, throughput and
+    latency percentiles (in milliseconds)."""
+    latencies = sorted(seconds for _, seconds, _ in samples)
+    statuses = {}
+    for status, _, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "throughput": round(len(samples) / elapsed, 2) if elapsed else None,
+        "statuses": statuses,
+        "latency_ms": {
+            "min": ms(latencies[0] if latencies else None),
+            "mean": ms(sum(latencies) / len(latencies) if latencies else None),
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+    }
+
+
+def compare(previous, current):
+    """Lines comparing throughput and latencies of two results."""
+    lines = []
+    for name in ["total"] + sorted(current["scenarios"]):
+        before = (
+            previous["total"] if name == "total" else previous["scenarios"].get(name)
+        )
+        after = current["total"] if name == "total" else current["scenarios"][name]
+        if before is None:
+            continue
+        parts = [
+            f"{key} {before['latency_ms'][key]} -> {after['latency_ms'][key]} ms"
+            for key in ("p50", "p95", "p99")
+        ]
+        lines.append(
+            f"{name:<14} {before['throughput']} -> {after['throughput']} req/s, "
+            + ", ".join(parts)
+        )
+    return lines
+
+
+class LoadTest:
+    """Runs a weighted mix of scenarios against a running registration
+    service. Identifiers and locations are unique per run, so runs can be
+    repeated against the same database."""
+
+    def __init__(self, client, username, password, prefix, mix, seed=None, run_id=None):
+        self.client = client
+        self.username = username
+        self.password = password
+        self.prefix = prefix
+        self.weights = mix
+        self.random = random.Random(seed)
+        self.run_id = run_id or uuid.uuid4().hex[:8]
+        self.token = None
+        self.identifiers = []
+        self.samples = {name: [] for name in mix}
+        self.stale_token_retries = 0
+        self._counter = 0
+        self.scenarios = dict(
+            token=self.login,
+            create=self.create,
+            update=self.update,
+            get=self.get,
+            get_locations=self.get_locations,
+            lookup=self.lookup,
+            location=self.location,
+        )
+
+    def _new_identifier(self):
+        self._counter += 1
+        return f"{self.prefix}loadtest-{self.run_id}-{self._counter}"
+
+    def _location(self, identifier, version=0):
+        return f"https://loadtest.example.org/{identifier}/{version}"
+
+    async def _request(self, method, url, **kwargs):
+        # A token scenario replaces the token; requests that were already
+        # underway with the previous token are retried once.
+        while True:
+            token = self.token
+            response = await self.client.request(
+                method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs
+            )
+            if response.status_code != 401 or token == self.token:
+                return response
+            self.stale_token_retries += 1
+
+    async def login(self):
+        response = await self.client.post(
+            "/token", json=dict(username=self.username, password=self.password)
+        )
+        if response.status_code == 200:
+            self.token = response.text
+        return response
+
+    async def create(self):
+        identifier = self._new_identifier()
+        response = await self._request(
+            "POST",
+            "/nbn",
+            json=dict(identifier=identifier, locations=[self._location(identifier)]),
+        )
+        if response.status_code == 201:
+            self.identifiers.append(identifier)
+        return response
+
+    def _existing_identifier(self):
+        return self.random.choice(self.identifiers) if self.identifiers else None
+
+    async def update(self):
+        if (identifier := self._existing_identifier()) is None:
+            return await self.create()
+        return await self._request(
+            "PUT",
+            f"/nbn/{identifier}",
+            json=[
+                self._location(identifier, self.random.randint(0, 3)),
+                self._location(identifier),
+            ],
+        )
+
+    async def get(self):
+        if (identifier := self._existing_identifier()) is None:
+            return await self.create()
+        return await self._request("GET", f"/nbn/{identifier}")
+
+    async def get_locations(self):
+        if (identifier := self._existing_identifier()) is None:
+            return await self.create()
+        return await self._request("GET", f"/nbn/{identifier}/locations")
+
+    async def lookup(self):
+        if not self.identifiers:
+            return await self.create()
+        identifiers = self.random.sample(
+            self.identifiers, min(len(self.identifiers), 10)
+        )
+        return await self._request("POST", "/nbn/lookup", json=identifiers)
+
+    async def location(self):
+        if (identifier := self._existing_identifier()) is None:
+            return await self.create()
+        return await self._request("GET", f"/location/{self._location(identifier)}")
+
+    async def _run_scenario(self, name):
+        t0 = time.perf_counter()
+        try:
+            response = await self.scenarios[name]()
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - t0
+        self.samples[name].append((status, elapsed, status in EXPECTED_STATUS[name]))
+
+    async def run(self, concurrency, requests=None, duration=None, initial=0):
+        """Runs `requests` requests in total, or for `duration` seconds, with
+        `concurrency` requests underway at any time. The `initial`
+        identifiers created beforehand are not measured."""
+        (await self.login()).raise_for_status()
+        for _ in range(initial):
+            await self.create()
+
+        names = list(self.weights)
+        weights = [self.weights[name] for name in names]
+        remaining = requests
+        deadline = None if duration is None else time.perf_counter() + duration
+
+        async def worker():
+            nonlocal remaining
+            while True:
+                if remaining is not None:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                name = self.random.choices(names, weights)[0]
+                await self._run_scenario(name)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+
+        return {
+            "run_id": self.run_id,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime()),
+            "config": {
+                "base_url": str(self.client.base_url),
+                "concurrency": concurrency,
+                "requests": requests,
+                "duration": duration,
+                "mix": self.weights,
+            },
+            "elapsed": round(elapsed, 3),
+            "stale_token_retries": self.stale_token_retries,
+            "total": summarize(
+                [sample for each in self.samples.values() for sample in each], elapsed
+            ),
+            "scenarios": {
+                name: summarize(samples, elapsed)
+                for name, samples in self.samples.items()
+                if samples
+            },
+        }
+
+
+async def run_loadtest(
+    base_url,
+    username,
+    password,
+    prefix,
+    mix=DEFAULT_MIX,
+    concurrency=10,
+    requests=None,
+    duration=None,
+    initial=100,
+    seed=None,
+    transport=None,
+):
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60, transport=transport
+    ) as client:
+        load_test = LoadTest(
+            client, username, password, prefix, parse_mix(mix), seed=seed
+        )
+        return await load_test.run(
+            concurrency, requests=requests, duration=duration, initial=initial
+        )
+
+
+def write_result(path, result):
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+
+
+def read_result(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,122 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import httpx
+import pytest
+
+from .loadtest import (
+    compare,
+    parse_mix,
+    percentile,
+    run_loadtest,
+    summarize,
+)
+
+
+def test_parse_mix():
+    assert parse_mix("get=10,create=2,token") == dict(get=10, create=2, token=1)
+    with pytest.raises(ValueError):
+        parse_mix("delete=1")
+    with pytest.raises(ValueError):
+        parse_mix("get=0")
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_summarize():
+    summary = summarize(
+        [(200, 0.001, True), (200, 0.003, True), (500, 0.002, False)], 2
+    )
+    assert summary["requests"] == 3
+    assert summary["errors"] == 1
+    assert summary["throughput"] == 1.5
+    assert summary["statuses"] == {"200": 2, "500": 1}
+    assert summary["latency_ms"]["p50"] == 2.0
+    assert summary["latency_ms"]["max"] == 3.0
+
+
+class FakeService:
+    def __init__(self):
+        self.tokens = 0
+        self.identifiers = {}
+        self.paths = []
+
+    def handle(self, request):
+        self.paths.append((request.method, request.url.path))
+        if request.url.path == "/token":
+            self.tokens += 1
+            return httpx.Response(200, text=f"token-{self.tokens}")
+        if request.headers["authorization"] != f"Bearer token-{self.tokens}":
+            return httpx.Response(401)
+        if request.method == "POST" and request.url.path == "/nbn":
+            body = httpx.Response(200, content=request.content).json()
+            self.identifiers[body["identifier"]] = body["locations"]
+            return httpx.Response(201)
+        if request.method == "PUT":
+            return httpx.Response(200)
+        return httpx.Response(200, json=[])
+
+
+async def test_run_loadtest():
+    service = FakeService()
+    result = await run_loadtest(
+        "http://testserver",
+        "user",
+        "secret",
+        "urn:nbn:nl:ui:13-",
+        mix="token=1,create=1,update=1,get=1,get_locations=1,lookup=1,location=1",
+        concurrency=4,
+        requests=200,
+        initial=5,
+        seed=1,
+        transport=httpx.MockTransport(service.handle),
+    )
+    assert result["total"]["requests"] == 200
+    assert result["total"]["errors"] == 0
+    assert set(result["scenarios"]) == {
+        "token",
+        "create",
+        "update",
+        "get",
+        "get_locations",
+        "lookup",
+        "location",
+    }
+    assert len(service.identifiers) == 5 + result["scenarios"]["create"]["requests"]
+    assert all(
+        each.startswith(f"urn:nbn:nl:ui:13-loadtest-{result['run_id']}-")
+        for each in service.identifiers
+    )
+
+    assert compare(result, result)[0].startswith("total")
@@ -28,12 +28,23 @@ import argparse
 import asyncio
 import pathlib
 import getpass
+import os
 
 from swl import configure_logging, uvicorn_main
 
 from gmh_registration_service.config import Config
 from gmh_registration_service.server import create_app
-from gmh_registration_service.database import Database
+from gmh_registration_service.database import create_database
+from gmh_registration_service.importer import FORMATS, run_import
+from gmh_registration_service.loadtest import (
+    DEFAULT_MIX,
+    compare,
+    read_result,
+    run_loadtest,
+    write_result,
+)
+from gmh_registration_service.passwords import PasswordHasher
+from gmh_registration_service.workers import run_workers
 
 
 def passwd():
@@ -63,9 +74,212 @@ def passwd():
     args = parser.parse_args()
     config = Config(args.data_path, False)
 
-    database = Database(**config.database_config)
+    database = create_database(config)
     new_password = getpass.getpass("New password: ")
-    database.set_password(args.groupid, args.username, new_password)
+
+    password_hasher = PasswordHasher(max_workers=1)
+    try:
+        hashed_password = asyncio.run(password_hasher.hash(new_password))
+    finally:
+        password_hasher.shutdown()
+    database.set_password(args.groupid, args.username, hashed_password)
+
+
+def migrate():
+    parser = argparse.ArgumentParser(
+        prog="GMH Registration Service - migrate", description="Database migrations"
+    )
+    parser.add_argument(
+        "--data-path",
+        required=True,
+        type=pathlib.Path,
+        help="Path to data directory which will contain config directory and store data",
+    )
+
+    args = parser.parse_args()
+    config = Config(args.data_path, False)
+
+    database = create_database(config)
+    if database.add_location_hash():
+        print("Added and filled location.location_url_hash")
+    else:
+        print("location.location_url_hash already exists")
+    if database.add_registrant_index():
+        print("Added index identifier_registrant (registrant_id, identifier_id)")
+    else:
+        print(
+            "Index identifier_registrant (registrant_id, identifier_id) already exists"
+        )
+
+
+def bulk_import():
+    parser = argparse.ArgumentParser(
+        prog="GMH Registration Service - import",
+        description="Import identifiers and locations straight into the database",
+    )
+    parser.add_argument(
+        "--data-path",
+        required=True,
+        type=pathlib.Path,
+        help="Path to data directory which will contain config directory and store data",
+    )
+    parser.add_argument(
+        "--groupid",
+        required=True,
+        type=str,
+        help="Groupid of the registrant to register the identifiers for",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        help="Format of the input, default csv for *.csv files and ndjson otherwise",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=10000,
+        help="Identifiers per transaction, default %(default)s",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=pathlib.Path,
+        help="Progress file to resume from, default <input>.checkpoint",
+    )
+    parser.add_argument(
+        "--errors",
+        type=pathlib.Path,
+        help="Write the rejected rows as NDJSON to this file",
+    )
+    parser.add_argument(
+        "input",
+        type=pathlib.Path,
+        help="CSV (identifier,location,...) or NDJSON "
+        '({"identifier": ..., "locations": [...]}) file',
+    )
+
+    args = parser.parse_args()
+    config = Config(args.data_path, False)
+
+    database = create_database(config)
+    if (registrant_id := database.get_registrant_id_by_groupid(args.groupid)) is None:
+        parser.error(f"Unknown registrant {args.groupid!r}")
+    if (
+        credentials_id := database.get_credentials_by_registrant_id(registrant_id)
+    ) is None:
+        parser.error(f"Registrant {args.groupid!r} has no credentials")
+    user = database.get_user_by_credentials_id(credentials_id)
+
+    def progress(checkpoint, rows, elapsed):
+        print(
+            f"Line {checkpoint.line}: {checkpoint.imported} imported,"
+            f" {checkpoint.failed} rejected, {rows / elapsed:.0f} rows/s",
+            flush=True,
+        )
+
+    errors = args.errors.open("a") if args.errors else None
+    try:
+        checkpoint = run_import(
+            database,
+            user,
+            args.input,
+            args.checkpoint or args.input.with_name(args.input.name + ".checkpoint"),
+            format=args.format,
+            chunk_size=args.chunk_size,
+            errors=errors,
+            progress=progress,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if errors is not None:
+            errors.close()
+    print(f"Done: {checkpoint.imported} imported, {checkpoint.failed} rejected")
+
+
+def loadtest():
+    parser = argparse.ArgumentParser(
+        prog="GMH Registration Service - loadtest",
+        description="Load test a running registration service",
+    )
+    parser.add_argument(
+        "--url",
+        required=True,
+        help="Base url of the service, e.g. http://localhost:9000",
+    )
+    parser.add_argument(
+        "--username",
+        required=True,
+        help="Username to request tokens for; the password is read from "
+        "$GMH_PASSWORD or prompted for",
+    )
+    parser.add_argument(
+        "--prefix",
+        required=True,
+        help="Identifier prefix of the registrant, e.g. urn:nbn:nl:ui:13-",
+    )
+    parser.add_argument(
+        "--mix",
+        default=DEFAULT_MIX,
+        help="Weighted scenarios, default %(default)s",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="Concurrent requests, default %(default)s",
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--requests", type=int, help="Total number of requests")
+    group.add_argument("--duration", type=float, help="Duration in seconds, default 30")
+    parser.add_argument(
+        "--initial",
+        type=int,
+        default=100,
+        help="Identifiers created before measuring, default %(default)s",
+    )
+    parser.add_argument("--seed", type=int, help="Seed for choosing scenarios")
+    parser.add_argument(
+        "--output", type=pathlib.Path, help="Write results as JSON to this file"
+    )
+    parser.add_argument(
+        "--compare", type=pathlib.Path, help="JSON results of a previous run"
+    )
+
+    args = parser.parse_args()
+    password = os.environ.get("GMH_PASSWORD") or getpass.getpass("Password: ")
+
+    result = asyncio.run(
+        run_loadtest(
+            args.url,
+            args.username,
+            password,
+            args.prefix,
+            mix=args.mix,
+            concurrency=args.concurrency,
+            requests=args.requests,
+            duration=(
+                30 if args.requests is None and args.duration is None else args.duration
+            ),
+            initial=args.initial,
+            seed=args.seed,
+        )
+    )
+
+    for name, summary in [("total", result["total"])] + sorted(
+        result["scenarios"].items()
+    ):
+        latency = summary["latency_ms"]
+        print(
+            f"{name:<14} {summary['requests']:>7} requests {summary['errors']:>5} errors"
+            f" {summary['throughput']:>9} req/s"
+            f"  p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms"
+        )
+    if args.compare:
+        print(f"Compared to {args.compare}:")
+        for line in compare(read_result(args.compare), result):
+            print(line)
+    if args.output:
+        write_result(args.output, result)
 
 
 def main_app():
@@ -98,6 +312,41 @@ def main_app():
         default="INFO",
         help="Log level, default %(default)s",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes, default %(default)s. Every worker has its "
+        "own database pool, caches and rate limits: with more than one the token "
+        "and location caches expire after worker_cache_ttl seconds (default 5), "
+        "registrant limit rates are divided over the workers and /metrics shows "
+        "the buckets of one worker, read-your-writes and signed token revocation "
+        "only hold within a worker, and the auth throttle applies per worker",
+    )
+    parser.add_argument(
+        "--reuse-port",
+        action="store_true",
+        default=False,
+        help="Let every worker bind the port with SO_REUSEPORT",
+    )
+    parser.add_argument(
+        "--loop",
+        choices=["auto", "asyncio", "uvloop"],
+        default="auto",
+        help="Event loop, default %(default)s (uvloop if installed)",
+    )
+    parser.add_argument(
+        "--http",
+        choices=["auto", "h11", "httptools"],
+        default="auto",
+        help="HTTP parser, default %(default)s (httptools if installed)",
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=None,
+        help="Restart a worker after this many requests (plus up to 10%%)",
+    )
     args = parser.parse_args()
 
     configure_logging(args.log_level)
@@ -106,6 +355,25 @@ def main_app():
 
     config = Config(args.data_path, development=arg_vars.pop("development", False))
 
+    # Anything but the defaults needs the pre-fork supervisor
+    workers = {
+        name: arg_vars.pop(name)
+        for name in ("workers", "reuse_port", "loop", "http", "max_requests")
+    }
+    if workers != {name: parser.get_default(name) for name in workers}:
+        if workers["workers"] > 1:
+            config.share_between_workers(workers["workers"])
+        run_workers(
+            create_app,
+            config,
+            args.host,
+            args.port,
+            initializer=configure_logging,
+            initargs=(args.log_level,),
+            **workers,
+        )
+        return
+
     asyncio.run(
         uvicorn_main(
             create_app=create_app,
@@ -41,4 +41,10 @@ SUCCESS_UPDATED = "OK (updated existing)"
 
 BAD_REQUEST = "Bad request"
 INTERNAL_ERROR = "Internal server error"
+SERVICE_UNAVAILABLE = "Service temporarily unavailable, please retry later"
+TOO_MANY_REQUESTS = "Too many requests, please retry later"
 NOT_FOUND = "Object (location) not found"
+READY = "Ready"
+NOT_READY = "Not ready"
+JOB_NOT_FOUND = "Job not found"
+PAYLOAD_TOO_LARGE = "Payload too large"
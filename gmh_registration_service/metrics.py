@@ -0,0 +1,352 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import threading
+import time
+
+from starlette.routing import Match
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            if (series := self._values.get(key)) is None:
+                series = self._values[key] = dict(
+                    buckets=[0] * len(self.buckets), count=0, sum=0.0
+                )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["count"] += 1
+            series["sum"] += value
+
+    def samples(self):
+        with self._lock:
+            values = {
+                key: dict(series, buckets=list(series["buckets"]))
+                for key, series in self._values.items()
+            }
+        for key, series in sorted(values.items()):
+            labels = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, series["buckets"]):
+                yield f"{self.name}_bucket", labels + [("le", bound)], count
+            yield f"{self.name}_bucket", labels + [("le", "+Inf")], series["count"]
+            yield f"{self.name}_sum", labels, series["sum"]
+            yield f"{self.name}_count", labels, series["count"]
+
+
+class Collected:
+    """Reports the values returned by `collect`, a callable returning
+    [(labels_dict, value), ...], at the moment the metrics are rendered."""
+
+    def __init__(self, name, help, collect, type="gauge"):
+        self.name = name
+        self.help = help
+        self.type = type
+        self._collect = collect
+
+    def samples(self):
+        for labels, value in self._collect():
+            yield self.name, sorted(labels.items()), value
+
+
+class Metrics:
+    def __init__(self):
+        self.requests = Counter(
+            "gmh_http_requests_total",
+            "HTTP requests by route, method and status code",
+            ("route", "method", "status"),
+        )
+        self.request_duration = Histogram(
+            "gmh_http_request_duration_seconds",
+            "HTTP request latency by route",
+            ("route", "method"),
+        )
+        self.database_calls = Histogram(
+            "gmh_database_call_duration_seconds",
+            "Duration of Database method calls",
+            ("method",),
+        )
+        self.statements = Histogram(
+            "gmh_database_statement_duration_seconds",
+            "Duration of SQL statements by statement type",
+            ("statement",),
+        )
+        self.bcrypt = Histogram(
+            "gmh_bcrypt_duration_seconds",
+            "Duration of password hashing and verification, including queueing",
+            ("operation",),
+        )
+        self._metrics = [
+            self.requests,
+            self.request_duration,
+            self.database_calls,
+            self.statements,
+            self.bcrypt,
+        ]
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def register_database_metrics(metrics, database):
+    pools = dict(primary=database.pool)
+    if database.replica is not None:
+        pools["replica"] = database.replica.pool
+    caches = dict(
+        token=database.token_cache,
+        invalid_token=database.invalid_token_cache,
+        location=database.location_cache,
+    )
+
+    for name, help, collect, type in [
+        (
+            "gmh_database_pool_connections",
+            "Database connections by state",
+            lambda: [
+                (dict(pool=name, state=state), pool.stats()[state])
+                for name, pool in pools.items()
+                for state in ("in_use", "idle")
+            ],
+            "gauge",
+        ),
+        (
+            "gmh_database_pool_checkouts_total",
+            "Database connection checkouts",
+            lambda: [(dict(pool=k), p.checkouts) for k, p in pools.items()],
+            "counter",
+        ),
+        (
+            "gmh_database_pool_checkout_failures_total",
+            "Database connection checkouts that timed out or failed to connect",
+            lambda: [(dict(pool=k), p.checkout_failures) for k, p in pools.items()],
+            "counter",
+        ),
+        (
+            "gmh_database_pool_wait_seconds_total",
+            "Time spent waiting for a database connection",
+            lambda: [(dict(pool=k), p.wait_time) for k, p in pools.items()],
+            "counter",
+        ),
+        (
+            "gmh_database_pool_max_wait_seconds",
+            "Longest wait for a database connection",
+            lambda: [(dict(pool=k), p.max_wait_time) for k, p in pools.items()],
+            "gauge",
+        ),
+        (
+            "gmh_database_slow_queries_total",
+            "SQL statements slower than the slow query threshold",
+            lambda: [({}, database.slow_query_log.slow_queries)],
+            "counter",
+        ),
+        (
+            "gmh_cache_hits_total",
+            "Cache hits",
+            lambda: [(dict(cache=k), c.hits) for k, c in caches.items()],
+            "counter",
+        ),
+        (
+            "gmh_cache_misses_total",
+            "Cache misses",
+            lambda: [(dict(cache=k), c.misses) for k, c in caches.items()],
+            "counter",
+        ),
+        (
+            "gmh_cache_entries",
+            "Cache entries",
+            lambda: [(dict(cache=k), len(c)) for k, c in caches.items()],
+            "gauge",
+        ),
+    ]:
+        metrics.register(Collected(name, help, collect, type=type))
+
+
+def register_rate_limiter_metrics(
+    metrics, rate_limiter, registrant_limits, per_registrant=False
+):
+    """/metrics needs no authentication, so the registrant budgets are
+    reported per access type only, unless per_registrant is set: then
+    every registrant_groupid gets its own series."""
+    if rate_limiter is not None:
+        metrics.register(
+            Collected(
+                "gmh_auth_throttled_total",
+                "Requests of clients throttled after too many 401 responses",
+                lambda: [({}, rate_limiter.rejected)],
+                type="counter",
+            )
+        )
+    if per_registrant:
+        metrics.register(
+            Collected(
+                "gmh_registrant_bucket_tokens",
+                "Tokens left in the read and write budgets of registrants",
+                lambda: [
+                    (dict(registrant_groupid=groupid, access=access), tokens)
+                    for groupid, access, tokens in registrant_limits.state()
+                ],
+            )
+        )
+        metrics.register(
+            Collected(
+                "gmh_registrant_throttled_total",
+                "Requests refused because the registrant's budget was exhausted",
+                lambda: [
+                    (dict(registrant_groupid=groupid, access=access), count)
+                    for (groupid, access), count in sorted(
+                        registrant_limits.rejected.items()
+                    )
+                ],
+                type="counter",
+            )
+        )
+        return
+
+    def by_access(pairs):
+        totals = dict.fromkeys(registrant_limits.ACCESS, 0)
+        for access, value in pairs:
+            totals[access] += value
+        return [(dict(access=access), total) for access, total in totals.items()]
+
+    metrics.register(
+        Collected(
+            "gmh_registrant_buckets_exhausted",
+            "Registrants without tokens left in their read or write budget",
+            lambda: by_access(
+                (access, int(tokens < 1))
+                for _, access, tokens in registrant_limits.state()
+            ),
+        )
+    )
+    metrics.register(
+        Collected(
+            "gmh_registrant_throttled_total",
+            "Requests refused because the registrant's budget was exhausted",
+            lambda: by_access(
+                (access, count)
+                for (_, access), count in list(registrant_limits.rejected.items())
+            ),
+            type="counter",
+        )
+    )
+
+
+class MetricsMiddleware:
+    """Records count and latency of every HTTP request, labelled with the
+    path template of the matched route to keep the number of series small."""
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route(scope)
+            self.metrics.requests.inc(
+                route=route, method=scope["method"], status=status
+            )
+            self.metrics.request_duration.observe(
+                time.perf_counter() - t0, route=route, method=scope["method"]
+            )
+
+    @staticmethod
+    def _route(scope):
+        if (route := scope.get("route")) is None and (app := scope.get("app")):
+            route = next(
+                (each for each in app.routes if each.matches(scope)[0] != Match.NONE),
+                None,
+            )
+        return getattr(route, "path", "unmatched")
@@ -0,0 +1,142 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from .metrics import (
+    Collected,
+    Counter,
+    Histogram,
+    Metrics,
+    MetricsMiddleware,
+    register_rate_limiter_metrics,
+)
+from .ratelimit import RegistrantLimits
+
+
+def test_counter():
+    counter = Counter("requests_total", "Requests", ("route", "status"))
+    counter.inc(route="/nbn", status=200)
+    counter.inc(route="/nbn", status=200)
+    counter.inc(route='/"quoted"', status=404)
+    assert list(counter.samples()) == [
+        ("requests_total", [("route", '/"quoted"'), ("status", 404)], 1),
+        ("requests_total", [("route", "/nbn"), ("status", 200)], 2),
+    ]
+
+
+def test_histogram():
+    histogram = Histogram("duration_seconds", "Duration", ("method",), (0.1, 1))
+    histogram.observe(0.05, method="get_locations")
+    histogram.observe(0.5, method="get_locations")
+    assert list(histogram.samples()) == [
+        ("duration_seconds_bucket", [("method", "get_locations"), ("le", 0.1)], 1),
+        ("duration_seconds_bucket", [("method", "get_locations"), ("le", 1)], 2),
+        ("duration_seconds_bucket", [("method", "get_locations"), ("le", "+Inf")], 2),
+        ("duration_seconds_sum", [("method", "get_locations")], 0.55),
+        ("duration_seconds_count", [("method", "get_locations")], 2),
+    ]
+
+
+def test_render():
+    metrics = Metrics()
+    metrics.requests.inc(route="/nbn", method="POST", status=201)
+    metrics.register(
+        Collected("pool_connections", "Connections", lambda: [({"state": "idle"}, 3)])
+    )
+    text = metrics.render()
+    assert "# TYPE gmh_http_requests_total counter\n" in text
+    assert (
+        'gmh_http_requests_total{route="/nbn",method="POST",status="201"} 1\n' in text
+    )
+    assert "# TYPE gmh_bcrypt_duration_seconds histogram\n" in text
+    assert "# TYPE pool_connections gauge\n" in text
+    assert 'pool_connections{state="idle"} 3\n' in text
+
+
+def test_registrant_metrics():
+    limits = RegistrantLimits(write=dict(rate=1, burst=1), timer=lambda: 0)
+    limits.consume("secret-registrant", "write")
+    limits.consume("secret-registrant", "write")
+    metrics = Metrics()
+    register_rate_limiter_metrics(metrics, None, limits)
+    text = metrics.render()
+    # /metrics needs no authentication: no registrant_groupid by default
+    assert "secret-registrant" not in text
+    assert 'gmh_registrant_buckets_exhausted{access="write"} 1\n' in text
+    assert 'gmh_registrant_throttled_total{access="write"} 1\n' in text
+    assert 'gmh_registrant_throttled_total{access="read"} 0\n' in text
+
+    metrics = Metrics()
+    register_rate_limiter_metrics(metrics, None, limits, per_registrant=True)
+    assert (
+        'gmh_registrant_throttled_total{access="write",registrant_groupid="secret-registrant"} 1\n'
+        in metrics.render()
+    )
+
+
+async def test_middleware_labels_by_route_template():
+    async def endpoint(request):
+        return PlainTextResponse("OK")
+
+    metrics = Metrics()
+    app = MetricsMiddleware(
+        Starlette(routes=[Route("/nbn/{identifier:str}", endpoint)]), metrics
+    )
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    for path in ["/nbn/urn:nbn:nl:ui:42-1", "/nbn/urn:nbn:nl:ui:42-2", "/other"]:
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [],
+        }
+        await app(scope, receive, send)
+
+    assert list(metrics.requests.samples()) == [
+        (
+            "gmh_http_requests_total",
+            [("route", "/nbn/{identifier:str}"), ("method", "GET"), ("status", 200)],
+            2,
+        ),
+        (
+            "gmh_http_requests_total",
+            [("route", "unmatched"), ("method", "GET"), ("status", 404)],
+            1,
+        ),
+    ]
@@ -0,0 +1,88 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import asyncio
+import bcrypt
+import multiprocessing
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+def hash_password(password):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+
+
+def check_password(password, hashed_password):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """Runs bcrypt in a process pool so it does not block the event loop.
+
+    At most `max_workers` hashes are computed at the same time and at most
+    `max_queue` more may wait; further requests raise PasswordHasherBusy."""
+
+    def __init__(self, max_workers=2, max_queue=16, histogram=None):
+        self.max_workers = max_workers
+        self.histogram = histogram
+        self.max_queue = max_queue
+        self.pending = 0
+        self._executor = None
+
+    async def hash(self, password):
+        return await self._run("hash", hash_password, password)
+
+    async def check(self, password, hashed_password):
+        return await self._run("check", check_password, password, hashed_password)
+
+    async def _run(self, operation, function, *args):
+        if self.pending >= self.max_workers + self.max_queue:
+            raise PasswordHasherBusy()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        self.pending += 1
+        t0 = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, function, *args
+            )
+        finally:
+            self.pending -= 1
+            if self.histogram is not None:
+                self.histogram.observe(time.perf_counter() - t0, operation=operation)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
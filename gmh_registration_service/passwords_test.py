@@ -0,0 +1,52 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import asyncio
+
+from .passwords import PasswordHasher, PasswordHasherBusy
+
+
+async def test_hash_and_check():
+    hasher = PasswordHasher(max_workers=1)
+    try:
+        hashed = await hasher.hash("Secret")
+        assert await hasher.check("Secret", hashed.decode("utf-8"))
+        assert not await hasher.check("Wrong", hashed.decode("utf-8"))
+        assert hasher.pending == 0
+    finally:
+        hasher.shutdown()
+
+
+async def test_busy():
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+    try:
+        results = await asyncio.gather(
+            *(hasher.hash("Secret") for _ in range(3)), return_exceptions=True
+        )
+        assert [type(each) for each in results].count(PasswordHasherBusy) == 1
+        assert hasher.pending == 0
+    finally:
+        hasher.shutdown()
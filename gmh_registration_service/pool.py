@@ -0,0 +1,181 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import logging
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections.
+
+    Keeps up to `pool_size` idle connections and opens at most `max_overflow`
+    extra ones under load, which are closed again when returned. A checkout
+    waits at most `timeout` seconds for a free connection, and connections
+    older than `recycle` seconds are replaced by new ones."""
+
+    def __init__(
+        self,
+        connect,
+        pool_size=5,
+        max_overflow=0,
+        timeout=30,
+        recycle=3600,
+        timer=time.monotonic,
+    ):
+        self._connect = connect
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self._timer = timer
+        self._idle = deque()
+        self._condition = threading.Condition()
+        self.closed = False
+        self.in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    @property
+    def max_connections(self):
+        return self.pool_size + self.max_overflow
+
+    @contextmanager
+    def connection(self):
+        created, connection = self._checkout()
+        try:
+            yield connection
+        except BaseException:
+            # The connection may be broken or mid-transaction; don't reuse it
+            self._checkin(created, connection, discard=True)
+            raise
+        self._checkin(created, connection)
+
+    def _checkout(self):
+        t0 = self._timer()
+        with self._condition:
+            while not self._idle and self.in_use >= self.max_connections:
+                remaining = self.timeout - (self._timer() - t0)
+                if remaining <= 0:
+                    self._record_wait(self._timer() - t0)
+                    self.checkout_failures += 1
+                    logger.warning(f"Database pool exhausted: {self.stats()}")
+                    raise PoolTimeout(
+                        f"No database connection available within {self.timeout}s"
+                    )
+                self._condition.wait(remaining)
+            self.in_use += 1
+            entry = self._idle.pop() if self._idle else None
+            self._record_wait(self._timer() - t0)
+            self.checkouts += 1
+
+        if entry is not None and self._timer() - entry[0] > self.recycle:
+            self._close(entry[1])
+            entry = None
+        if entry is None:
+            try:
+                entry = (self._timer(), self._connect())
+            except BaseException:
+                with self._condition:
+                    self.in_use -= 1
+                    self.checkout_failures += 1
+                    self._condition.notify()
+                raise
+        return entry
+
+    def _record_wait(self, waited):
+        self.wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+
+    def _checkin(self, created, connection, discard=False):
+        with self._condition:
+            self.in_use -= 1
+            if not discard and not self.closed and len(self._idle) < self.pool_size:
+                self._idle.append((created, connection))
+                connection = None
+            self._condition.notify()
+        if connection is not None:
+            self._close(connection)
+
+    def warm_up(self, connections=None):
+        """Opens connections (default pool_size) so the first requests do
+        not have to. Returns the number of connections opened."""
+        wanted = min(
+            self.pool_size, self.pool_size if connections is None else connections
+        )
+        opened = 0
+        while len(self._idle) + self.in_use < wanted:
+            connection = self._connect()
+            with self._condition:
+                self._idle.append((self._timer(), connection))
+                self._condition.notify()
+            opened += 1
+        return opened
+
+    def close(self, timeout=0):
+        """Closes the idle connections, after waiting at most `timeout`
+        seconds for the connections in use to be returned. These are closed
+        when returned."""
+        deadline = self._timer() + timeout
+        with self._condition:
+            self.closed = True
+            while self.in_use and (remaining := deadline - self._timer()) > 0:
+                self._condition.wait(remaining)
+            if self.in_use:
+                logger.warning(f"Closing pool with {self.in_use} connections in use")
+            idle, self._idle = list(self._idle), deque()
+        for _, connection in idle:
+            self._close(connection)
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            logger.exception("Closing database connection failed")
+
+    def stats(self):
+        return dict(
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            in_use=self.in_use,
+            idle=len(self._idle),
+            checkouts=self.checkouts,
+            checkout_failures=self.checkout_failures,
+            wait_time=self.wait_time,
+            max_wait_time=self.max_wait_time,
+        )
@@ -0,0 +1,143 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import pytest
+import threading
+import time
+
+from .pool import ConnectionPool, PoolTimeout
+
+
+class Connection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_reuses_connections():
+    pool = ConnectionPool(Connection, pool_size=1)
+    with pool.connection() as first:
+        assert pool.stats()["in_use"] == 1
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert pool.stats()["idle"] == 1
+    assert pool.stats()["checkouts"] == 2
+
+
+def test_overflow_connections_are_closed():
+    pool = ConnectionPool(Connection, pool_size=1, max_overflow=1)
+    with pool.connection() as first:
+        with pool.connection() as second:
+            assert pool.stats()["in_use"] == 2
+    assert [first.closed, second.closed].count(True) == 1
+    assert pool.stats()["idle"] == 1
+
+
+def test_timeout():
+    pool = ConnectionPool(Connection, pool_size=1, timeout=0.05)
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+    assert pool.stats()["checkout_failures"] == 1
+    assert pool.stats()["max_wait_time"] >= 0.05
+
+
+def test_waits_for_returned_connection():
+    pool = ConnectionPool(Connection, pool_size=1, timeout=5)
+    checked_out = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            checked_out.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    checked_out.wait()
+    threading.Timer(0.05, release.set).start()
+    with pool.connection():
+        pass
+    thread.join()
+    assert pool.stats()["max_wait_time"] > 0
+
+
+def test_recycle_and_discard():
+    now = [0]
+    pool = ConnectionPool(Connection, pool_size=1, recycle=10, timer=lambda: now[0])
+    with pool.connection() as first:
+        pass
+    now[0] = 11
+    with pool.connection() as second:
+        pass
+    assert first.closed
+    assert second is not first
+
+    with pytest.raises(RuntimeError):
+        with pool.connection() as third:
+            raise RuntimeError()
+    assert third.closed
+    assert pool.stats()["idle"] == 0
+    assert pool.stats()["in_use"] == 0
+
+
+def test_warm_up():
+    pool = ConnectionPool(Connection, pool_size=3)
+    assert pool.warm_up(2) == 2
+    assert pool.stats()["idle"] == 2
+    assert pool.warm_up() == 1
+    assert pool.warm_up(10) == 0
+    assert pool.stats()["idle"] == 3
+    with pool.connection():
+        pass
+    assert pool.stats()["checkouts"] == 1
+    assert pool.stats()["idle"] == 3
+
+
+def test_close_waits_for_connections_in_use():
+    pool = ConnectionPool(Connection, pool_size=2)
+    pool.warm_up()
+    checked_out = threading.Event()
+    held = []
+
+    def hold():
+        with pool.connection() as connection:
+            held.append(connection)
+            checked_out.set()
+            time.sleep(0.05)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    checked_out.wait()
+    pool.close(timeout=5)
+    assert pool.stats()["in_use"] == 0
+    assert pool.stats()["idle"] == 0
+    thread.join()
+    assert held[0].closed
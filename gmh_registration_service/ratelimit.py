@@ -0,0 +1,153 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """Token buckets per key (e.g. a client IP) holding at most `burst`
+    tokens and refilled with `rate` tokens per second.
+
+    Only the `maxsize` most recently used buckets are kept; a forgotten
+    bucket starts full again. Safe to share between threads."""
+
+    def __init__(self, rate=1.0, burst=10, maxsize=10000, timer=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._timer = timer
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _tokens(self, key, now):
+        if (bucket := self._buckets.get(key)) is None:
+            return self.burst
+        tokens, updated = bucket
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def available(self, key):
+        """True if key has a token left, without taking it."""
+        with self._lock:
+            if self._tokens(key, self._timer()) >= 1:
+                return True
+            self.rejected += 1
+            return False
+
+    def consume(self, key, amount=1):
+        """Takes `amount` tokens for key; returns False if there were not
+        enough. An amount larger than `burst` is allowed with a full bucket
+        and leaves it in debt."""
+        with self._lock:
+            now = self._timer()
+            tokens = self._tokens(key, now)
+            allowed = tokens >= min(amount, self.burst)
+            if allowed:
+                tokens -= amount
+            else:
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def retry_after(self, key, amount=1):
+        """Whole seconds until key has `amount` tokens (again)."""
+        with self._lock:
+            missing = min(amount, self.burst) - self._tokens(key, self._timer())
+        if missing <= 0:
+            return 0
+        return math.ceil(missing / self.rate) if self.rate > 0 else 3600
+
+    def snapshot(self):
+        """{key: tokens} of the known buckets."""
+        with self._lock:
+            now = self._timer()
+            return {key: self._tokens(key, now) for key in self._buckets}
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RegistrantLimits:
+    """Separate read and write budgets per registrant_groupid.
+
+    `read` and `write` are the RateLimiter settings (rate, burst) for every
+    registrant, `groups` overrides them per registrant_groupid, e.g.
+    {"bulk": {"write": {"rate": 5, "burst": 10}}}. Registrants without any
+    settings for an access type are not limited.
+
+    The buckets are per process; with several workers the rates are divided
+    over them by Config.share_between_workers."""
+
+    ACCESS = ("read", "write")
+
+    def __init__(self, read=None, write=None, groups=None, timer=time.monotonic):
+        defaults = dict(read=read, write=write)
+        self._limiters = {
+            (None, access): RateLimiter(**defaults[access], timer=timer)
+            for access in self.ACCESS
+            if defaults[access]
+        }
+        for groupid, limits in (groups or {}).items():
+            for access, settings in limits.items():
+                self._limiters[(groupid.lower(), access)] = RateLimiter(
+                    **settings, timer=timer
+                )
+        self._lock = threading.Lock()
+        self.rejected = {}
+
+    def _limiter(self, groupid, access):
+        if (limiter := self._limiters.get((groupid, access))) is not None:
+            return limiter
+        return self._limiters.get((None, access))
+
+    def consume(self, groupid, access, amount=1):
+        """Takes `amount` from the registrant's `access` budget. Returns None
+        if allowed, otherwise the number of seconds to wait."""
+        groupid = groupid.lower()
+        if (limiter := self._limiter(groupid, access)) is None:
+            return None
+        if limiter.consume(groupid, amount):
+            return None
+        with self._lock:
+            self.rejected[(groupid, access)] = (
+                self.rejected.get((groupid, access), 0) + 1
+            )
+        return limiter.retry_after(groupid, amount)
+
+    def state(self):
+        """[(groupid, access, tokens), ...] for the buckets in use."""
+        return sorted(
+            (groupid, access, tokens)
+            for (owner, access), limiter in self._limiters.items()
+            for groupid, tokens in limiter.snapshot().items()
+            if owner is None or owner == groupid
+        )
@@ -0,0 +1,111 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from .ratelimit import RateLimiter, RegistrantLimits
+from .test_utils import Clock
+
+
+def test_consume_until_empty():
+    limiter = RateLimiter(rate=1, burst=2, timer=Clock())
+    assert limiter.available("10.0.0.1")
+    assert limiter.consume("10.0.0.1")
+    assert limiter.consume("10.0.0.1")
+    assert not limiter.available("10.0.0.1")
+    assert not limiter.consume("10.0.0.1")
+    assert limiter.rejected == 2
+    # Other keys have their own bucket
+    assert limiter.consume("10.0.0.2")
+
+
+def test_refill():
+    clock = Clock()
+    limiter = RateLimiter(rate=0.5, burst=2, timer=clock)
+    limiter.consume("key")
+    limiter.consume("key")
+    assert limiter.retry_after("key") == 2
+    clock.now = 1
+    assert not limiter.available("key")
+    assert limiter.retry_after("key") == 1
+    clock.now = 2
+    assert limiter.available("key")
+    assert limiter.retry_after("key") == 0
+    clock.now = 100
+    assert limiter.consume("key")
+    assert limiter.consume("key")
+    assert not limiter.consume("key")
+
+
+def test_bounded():
+    limiter = RateLimiter(rate=1, burst=1, maxsize=2, timer=Clock())
+    for key in ("a", "b", "c"):
+        limiter.consume(key)
+    assert len(limiter) == 2
+    # The least recently used bucket was forgotten and starts full again
+    assert limiter.available("a")
+    assert not limiter.available("c")
+
+
+def test_large_amount_leaves_debt():
+    clock = Clock()
+    limiter = RateLimiter(rate=1, burst=10, timer=clock)
+    assert limiter.consume("key", 25)
+    assert limiter.snapshot() == {"key": -15}
+    assert not limiter.consume("key")
+    assert limiter.retry_after("key") == 16
+    clock.now = 16
+    assert limiter.consume("key")
+
+
+def test_registrant_limits():
+    clock = Clock()
+    limits = RegistrantLimits(
+        read=dict(rate=1, burst=2),
+        write=dict(rate=1, burst=1),
+        groups={"Bulk": {"write": dict(rate=0.1, burst=1)}},
+        timer=clock,
+    )
+    assert limits.consume("small", "write") is None
+    assert limits.consume("small", "write") == 1
+    # Reads have their own budget
+    assert limits.consume("small", "read") is None
+
+    assert limits.consume("bulk", "write") is None
+    assert limits.consume("BULK", "write") == 10
+    assert limits.consume("bulk", "read", amount=2) is None
+
+    assert limits.rejected == {("small", "write"): 1, ("bulk", "write"): 1}
+    assert limits.state() == [
+        ("bulk", "read", 0),
+        ("bulk", "write", 0),
+        ("small", "read", 1),
+        ("small", "write", 0),
+    ]
+
+
+def test_no_registrant_limits():
+    limits = RegistrantLimits()
+    assert all(limits.consume("group", "write") is None for _ in range(100))
+    assert limits.state() == []
@@ -0,0 +1,118 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RegistrantIndex:
+    """In-memory copy of the small registrant/credentials tables, keyed by
+    prefix, groupid and registrant_id.
+
+    `load` returns rows with registrant_id, registrant_groupid, prefix and
+    credentials_id. Lookups return None when the index has no answer; the
+    caller then falls back to SQL and may call request_refresh()."""
+
+    def __init__(self, load):
+        self._load = load
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._by_prefix = {}
+            self._by_groupid = {}
+            self._credentials = {}
+
+    def refresh(self):
+        generation = self._generation
+        by_prefix, by_groupid, credentials = {}, {}, {}
+        for row in self._load():
+            # prefix is nullable; such a registrant is found by groupid only
+            if row["prefix"] is not None:
+                by_prefix.setdefault(row["prefix"].lower(), row["registrant_id"])
+            by_groupid.setdefault(
+                row["registrant_groupid"].lower(), row["registrant_id"]
+            )
+            if row["credentials_id"] is not None:
+                credentials.setdefault(row["registrant_id"], row["credentials_id"])
+
+        with self._lock:
+            # A clear() during loading makes the loaded rows suspect
+            if generation == self._generation:
+                self._by_prefix = by_prefix
+                self._by_groupid = by_groupid
+                self._credentials = credentials
+
+    def registrant_id_by_prefix(self, prefix):
+        return self._by_prefix.get(prefix.lower())
+
+    def registrant_id_by_groupid(self, groupid):
+        return self._by_groupid.get(groupid.lower())
+
+    def credentials_id_by_registrant_id(self, registrant_id):
+        return self._credentials.get(registrant_id)
+
+    def start(self, interval):
+        if self._thread is not None or not interval:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(interval,),
+            name="registrant-index",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def request_refresh(self):
+        self._wakeup.set()
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Refreshing registrant index failed")
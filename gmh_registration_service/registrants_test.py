@@ -0,0 +1,92 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import threading
+
+from .registrants import RegistrantIndex
+
+ROWS = [
+    dict(
+        registrant_id=1,
+        registrant_groupid="GROUP_ID",
+        prefix="urn:nbn:nl:ui:42-",
+        credentials_id=10,
+    ),
+    dict(
+        registrant_id=2,
+        registrant_groupid="ltp",
+        prefix="urn:nbn:nl:ui:24-",
+        credentials_id=None,
+    ),
+    dict(
+        registrant_id=3,
+        registrant_groupid="no-prefix",
+        prefix=None,
+        credentials_id=None,
+    ),
+]
+
+
+def test_lookups():
+    index = RegistrantIndex(lambda: ROWS)
+    assert index.registrant_id_by_prefix("urn:nbn:nl:ui:42-") is None
+
+    index.refresh()
+    assert index.registrant_id_by_prefix("URN:NBN:NL:UI:42-") == 1
+    assert index.registrant_id_by_groupid("ltp") == 2
+    assert index.registrant_id_by_groupid("no-prefix") == 3
+    assert index.registrant_id_by_groupid("unknown") is None
+    assert index.credentials_id_by_registrant_id(1) == 10
+    assert index.credentials_id_by_registrant_id(2) is None
+
+    index.clear()
+    assert index.registrant_id_by_groupid("ltp") is None
+
+
+def test_clear_during_refresh_discards_loaded_rows():
+    def load():
+        index.clear()
+        return ROWS
+
+    index = RegistrantIndex(load)
+    index.refresh()
+    assert index.registrant_id_by_groupid("ltp") is None
+
+
+def test_background_refresh_on_request():
+    loaded = threading.Event()
+
+    def load():
+        loaded.set()
+        return ROWS
+
+    index = RegistrantIndex(load)
+    index.start(interval=3600)
+    try:
+        index.request_refresh()
+        assert loaded.wait(5)
+    finally:
+        index.stop()
@@ -40,7 +40,21 @@ from . import VERSION
 from ._path import global_config_path, static_path, templates_path
 from .views import VIEWS
 
-from .database import Database
+from .async_database import AsyncDatabase
+from .cache import TTLCache
+from .database import create_database
+from .jobs import Jobs
+from .lifespan import Lifespan
+from .metrics import (
+    Metrics,
+    MetricsMiddleware,
+    register_database_metrics,
+    register_rate_limiter_metrics,
+)
+from .passwords import PasswordHasher
+from .ratelimit import RateLimiter, RegistrantLimits
+from .slow_queries import SlowQueryLog
+from .tokens import TokenSigner
 
 logger = logging.getLogger(__name__)
 
@@ -59,7 +73,32 @@ async def setup_environment(config):
         )
     )
 
-    database = Database(**config.database_config)
+    metrics = Metrics()
+    database = create_database(
+        config,
+        token_cache=TTLCache(**config.token_cache),
+        invalid_token_cache=TTLCache(**config.invalid_token_cache),
+        location_cache=TTLCache(**config.location_cache),
+        pool=config.database_pool,
+        token_signer=(
+            TokenSigner(**config.signed_tokens) if config.signed_tokens else None
+        ),
+        slow_query_log=SlowQueryLog(
+            **config.slow_query_log, histogram=metrics.statements
+        ),
+        read_your_writes=config.read_your_writes,
+    )
+    register_database_metrics(metrics, database)
+
+    # Throttles clients by their number of 401 responses; null disables it
+    rate_limiter = RateLimiter(**config.auth_throttle) if config.auth_throttle else None
+    registrant_limits = RegistrantLimits(**config.registrant_limits)
+    register_rate_limiter_metrics(
+        metrics,
+        rate_limiter,
+        registrant_limits,
+        per_registrant=config.registrant_metrics,
+    )
 
     templates.env.globals["register"] = actions.register
     templates.env.globals["VERSION"] = VERSION
@@ -68,16 +107,50 @@ async def setup_environment(config):
         resources_path=global_config_path / "web-resources.json",
     )
 
-    settings = {"development": config.development}
+    settings = {
+        "development": config.development,
+        "max_batch_size": config.max_batch_size,
+        "stream_batch_size": config.stream_batch_size,
+        "max_page_size": config.max_page_size,
+        "retry_after": config.retry_after,
+    }
     actions.register_kwarg("settings", settings)
     actions.register_kwarg("templates", templates)
-    actions.register_kwarg("database", database)
+    actions.register_kwarg("metrics", metrics)
+    actions.register_kwarg("rate_limiter", rate_limiter)
+    actions.register_kwarg("registrant_limits", registrant_limits)
 
-    return actions, templates, database
+    password_hasher = PasswordHasher(**config.password_hasher, histogram=metrics.bcrypt)
+    actions.register_kwarg("password_hasher", password_hasher)
+
+    async_database = AsyncDatabase(
+        database,
+        max_workers=database.pool.max_connections,
+        histogram=metrics.database_calls,
+    )
+    actions.register_kwarg("database", async_database)
+
+    jobs = Jobs(database=database, **config.jobs)
+    actions.register_kwarg("jobs", jobs)
+
+    lifespan = Lifespan(
+        database,
+        async_database,
+        password_hasher,
+        templates=templates,
+        jobs=jobs,
+        registrant_refresh_interval=config.registrant_refresh_interval,
+        **config.lifespan,
+    )
+    actions.register_kwarg("lifespan", lifespan)
+
+    return actions, templates, database, metrics, lifespan
 
 
 async def create_app(config, environment=None, **_):
-    (actions, templates, _) = environment or await setup_environment(config=config)
+    (actions, templates, _, metrics, lifespan) = (
+        environment or await setup_environment(config=config)
+    )
 
     aw = actions.wrap
 
@@ -102,6 +175,8 @@ async def create_app(config, environment=None, **_):
                 methods=["GET"],
             ),
             Route("/token", endpoint=aw(VIEWS.token.token), methods=["POST"]),
+            Route("/metrics", endpoint=aw(VIEWS.metrics.metrics), methods=["GET"]),
+            Route("/ready", endpoint=aw(VIEWS.health.ready), methods=["GET"]),
             Route(
                 "/location/{location:path}",
                 endpoint=aw(VIEWS.location.location),
@@ -112,6 +187,36 @@ async def create_app(config, environment=None, **_):
                 endpoint=aw(VIEWS.nbn.nbn),
                 methods=["POST"],
             ),
+            Route(
+                "/nbn",
+                endpoint=aw(VIEWS.nbn.nbn_list),
+                methods=["GET"],
+            ),
+            Route(
+                "/nbn/batch",
+                endpoint=aw(VIEWS.nbn.nbn_batch),
+                methods=["POST"],
+            ),
+            Route(
+                "/nbn/stream",
+                endpoint=aw(VIEWS.nbn.nbn_stream),
+                methods=["POST"],
+            ),
+            Route(
+                "/nbn/jobs",
+                endpoint=aw(VIEWS.jobs.job_create),
+                methods=["POST"],
+            ),
+            Route(
+                "/nbn/jobs/{id:str}",
+                endpoint=aw(VIEWS.jobs.job_status),
+                methods=["GET"],
+            ),
+            Route(
+                "/nbn/lookup",
+                endpoint=aw(VIEWS.nbn.nbn_lookup),
+                methods=["POST"],
+            ),
             Route(
                 "/nbn/{identifier:str}",
                 endpoint=aw(VIEWS.nbn.nbn_get),
@@ -128,5 +233,6 @@ async def create_app(config, environment=None, **_):
                 methods=["GET"],
             ),
         ],
-        middleware=[],
+        middleware=[Middleware(MetricsMiddleware, metrics=metrics)],
+        lifespan=lifespan,
     )
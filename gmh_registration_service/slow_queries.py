@@ -0,0 +1,120 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE")
+REDACTED = ("password", "token")
+
+
+def _redact(operation, params):
+    if isinstance(params, dict):
+        return {
+            key: "***" if key in REDACTED else value for key, value in params.items()
+        }
+    if params and any(each in operation.lower() for each in REDACTED):
+        return "***"
+    return params
+
+
+class SlowQueryLog:
+    """Times every statement and logs SQL, parameters and runtime of those
+    taking at least `threshold` seconds. With `explain` (meant for
+    development) the EXPLAIN output of these statements is logged as well."""
+
+    def __init__(self, threshold=1.0, explain=False, histogram=None):
+        self.threshold = threshold
+        self.explain = explain
+        self.histogram = histogram
+        self.slow_queries = 0
+
+    def wrap(self, connection, cursor):
+        return TimedCursor(self, connection, cursor)
+
+    def record(self, connection, operation, params, elapsed, many=False):
+        statement = operation.lstrip().split(None, 1)[0].upper() if operation else ""
+        if self.histogram is not None:
+            self.histogram.observe(elapsed, statement=statement)
+        if elapsed < self.threshold:
+            return
+
+        self.slow_queries += 1
+        message = f"Slow query ({elapsed:.3f}s): {operation} -- {_redact(operation, params)!r}"
+        if self.explain and not many and statement in EXPLAINABLE:
+            message += "\n" + self._explain(connection, operation, params)
+        logger.warning(message)
+
+    @staticmethod
+    def _explain(connection, operation, params):
+        try:
+            cursor = connection.cursor(buffered=True)
+            try:
+                cursor.execute("EXPLAIN " + operation, params)
+                rows = [cursor.column_names] + cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+        return "\n".join(" | ".join(str(each) for each in row) for row in rows)
+
+
+class TimedCursor:
+    def __init__(self, log, connection, cursor):
+        self._log = log
+        self._connection = connection
+        self._cursor = cursor
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._log.record(
+                self._connection, operation, params, time.perf_counter() - t0
+            )
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        seq_params = list(seq_params)
+        t0 = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._log.record(
+                self._connection,
+                operation,
+                f"<{len(seq_params)} rows>",
+                time.perf_counter() - t0,
+                many=True,
+            )
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
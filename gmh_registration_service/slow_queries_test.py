@@ -0,0 +1,114 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import logging
+
+from .metrics import Histogram
+from .slow_queries import SlowQueryLog
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.column_names = ("id", "select_type", "table")
+
+    def execute(self, operation, params=None):
+        self.connection.executed.append((operation, params))
+
+    def executemany(self, operation, seq_params):
+        self.connection.executed.append((operation, list(seq_params)))
+
+    def fetchall(self):
+        return [(1, "SIMPLE", "identifier")]
+
+    def close(self):
+        pass
+
+
+class Connection:
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self, buffered=False):
+        return Cursor(self)
+
+
+def test_fast_statements_are_not_logged(caplog):
+    histogram = Histogram("statements", "", ("statement",))
+    log = SlowQueryLog(threshold=1.0, histogram=histogram)
+    connection = Connection()
+    cursor = log.wrap(connection, Cursor(connection))
+    with caplog.at_level(logging.WARNING):
+        cursor.execute("SELECT 1")
+        cursor.executemany("INSERT INTO t VALUES (%s)", [(1,), (2,)])
+    assert caplog.records == []
+    assert log.slow_queries == 0
+    counts = [
+        (labels, value)
+        for name, labels, value in histogram.samples()
+        if name.endswith("_count")
+    ]
+    assert counts == [([("statement", "INSERT")], 1), ([("statement", "SELECT")], 1)]
+
+
+def test_slow_statement_is_logged_with_explain(caplog):
+    log = SlowQueryLog(threshold=0, explain=True)
+    connection = Connection()
+    cursor = log.wrap(connection, Cursor(connection))
+    with caplog.at_level(logging.WARNING):
+        cursor.execute("SELECT * FROM identifier WHERE identifier_value = %s", ("x",))
+    assert log.slow_queries == 1
+    [record] = caplog.records
+    assert "SELECT * FROM identifier WHERE identifier_value = %s" in record.message
+    assert "('x',)" in record.message
+    assert "SIMPLE | identifier" in record.message
+    assert connection.executed[-1][0].startswith("EXPLAIN SELECT")
+
+
+def test_no_explain_for_executemany(caplog):
+    log = SlowQueryLog(threshold=0, explain=True)
+    connection = Connection()
+    cursor = log.wrap(connection, Cursor(connection))
+    with caplog.at_level(logging.WARNING):
+        cursor.executemany("INSERT INTO t VALUES (%s)", [(1,), (2,)])
+    [record] = caplog.records
+    assert "<2 rows>" in record.message
+    assert len(connection.executed) == 1
+
+
+def test_secrets_are_redacted(caplog):
+    log = SlowQueryLog(threshold=0)
+    connection = Connection()
+    cursor = log.wrap(connection, Cursor(connection))
+    with caplog.at_level(logging.WARNING):
+        cursor.execute(
+            "UPDATE credentials SET token = %(token)s WHERE credentials_id = %(id)s",
+            dict(token="secret", id=1),
+        )
+        cursor.execute("SELECT * FROM credentials WHERE token = %s", ("secret",))
+    assert len(caplog.records) == 2
+    assert all("secret" not in record.message for record in caplog.records)
+    assert "'id': 1" in caplog.records[0].message
@@ -0,0 +1,235 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import re
+import sqlite3
+
+from .database import Database
+from .utils import unfragment
+
+# The columns that MySQL compares case-insensitively are COLLATE NOCASE
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS `registrant` (`registrant_id` INTEGER PRIMARY KEY AUTOINCREMENT, `registrant_groupid` TEXT NOT NULL UNIQUE COLLATE NOCASE, `prefix` TEXT, `isLTP` INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS `credentials` (`credentials_id` INTEGER PRIMARY KEY AUTOINCREMENT, `registrant_id` INTEGER NOT NULL REFERENCES `registrant` (`registrant_id`), `username` TEXT NOT NULL UNIQUE COLLATE NOCASE, `password` TEXT, `token` TEXT)",
+    "CREATE INDEX IF NOT EXISTS `credentials_token` ON `credentials` (`token`)",
+    "CREATE TABLE IF NOT EXISTS `identifier` (`identifier_id` INTEGER PRIMARY KEY AUTOINCREMENT, `identifier_value` TEXT NOT NULL UNIQUE COLLATE NOCASE)",
+    "CREATE TABLE IF NOT EXISTS `location` (`location_id` INTEGER PRIMARY KEY AUTOINCREMENT, `location_url` TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE IF NOT EXISTS `identifier_location` (`identifier_id` INTEGER NOT NULL REFERENCES `identifier` (`identifier_id`), `location_id` INTEGER NOT NULL REFERENCES `location` (`location_id`), `isFailover` INTEGER NOT NULL DEFAULT 0)",
+    "CREATE INDEX IF NOT EXISTS `identifier_location_identifier` ON `identifier_location` (`identifier_id`)",
+    "CREATE INDEX IF NOT EXISTS `identifier_location_location` ON `identifier_location` (`location_id`)",
+    "CREATE TABLE IF NOT EXISTS `identifier_registrant` (`registrant_id` INTEGER NOT NULL REFERENCES `registrant` (`registrant_id`), `identifier_id` INTEGER NOT NULL REFERENCES `identifier` (`identifier_id`))",
+    "CREATE INDEX IF NOT EXISTS `identifier_registrant_identifier` ON `identifier_registrant` (`identifier_id`, `registrant_id`)",
+    "CREATE INDEX IF NOT EXISTS `identifier_registrant_registrant` ON `identifier_registrant` (`registrant_id`, `identifier_id`)",
+]
+
+# The statements of Database are written for MySQL; these rewrite the few
+# constructs SQLite does not understand.
+_TRANSLATIONS = [
+    (re.compile(r"%\((\w+)\)s"), r":\1"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"^\s*START TRANSACTION\s*$", re.I), "BEGIN IMMEDIATE"),
+    (re.compile(r"\s+FOR UPDATE\b", re.I), ""),
+    (re.compile(r"^\s*TRUNCATE TABLE\s+", re.I), "DELETE FROM "),
+    (
+        re.compile(r"^\s*SET FOREIGN_KEY_CHECKS\s*=\s*0\s*$", re.I),
+        "PRAGMA foreign_keys = OFF",
+    ),
+    (
+        re.compile(r"^\s*SET FOREIGN_KEY_CHECKS\s*=\s*1\s*$", re.I),
+        "PRAGMA foreign_keys = ON",
+    ),
+    (re.compile(r"^\s*EXPLAIN\s+", re.I), "EXPLAIN QUERY PLAN "),
+]
+
+
+_TRUNCATE = re.compile(r"^\s*TRUNCATE TABLE\s+`?(\w+)`?\s*$", re.I)
+
+
+def translate(operation):
+    for pattern, replacement in _TRANSLATIONS:
+        operation = pattern.sub(replacement, operation)
+    return operation
+
+
+def _param(value):
+    # MySQL returns VARCHAR columns as str, also when bytes were written
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _params(params):
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        return {key: _param(value) for key, value in params.items()}
+    return [_param(value) for value in params]
+
+
+class _Cursor:
+    """The subset of the mysql.connector cursor API used by Database."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None):
+        result = self._cursor.execute(translate(operation), _params(params))
+        if match := _TRUNCATE.match(operation):
+            # Like MySQL's TRUNCATE, restart the AUTO_INCREMENT counter
+            self._cursor.execute(
+                "DELETE FROM sqlite_sequence WHERE name = ?", [match.group(1)]
+            )
+        return result
+
+    def executemany(self, operation, seq_params):
+        return self._cursor.executemany(
+            translate(operation), [_params(params) for params in seq_params]
+        )
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    @property
+    def column_names(self):
+        return tuple(each[0] for each in self._cursor.description or ())
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class _Connection:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, buffered=False):
+        return _Cursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+class SQLiteDatabase(Database):
+    """Database on a single SQLite file, for running the service and its
+    benchmarks without a MySQL server.
+
+    The schema is created when missing. With `read_only` the file is opened
+    as an immutable snapshot; requests that write (including issuing
+    tokens) then fail."""
+
+    def __init__(self, path, read_only=False, **kwargs):
+        # Deliberately not calling gmh_common's __init__, which is MySQL only
+        self.path = path
+        self.read_only = read_only
+        self._setup(self._connect, **kwargs)
+        if not read_only:
+            self.execute_statements(["PRAGMA journal_mode = WAL"] + SCHEMA)
+
+    def _connect(self):
+        # Autocommit mode; Database.transaction() issues BEGIN and COMMIT
+        connection = sqlite3.connect(
+            f"file:{self.path}?mode={'ro' if self.read_only else 'rwc'}",
+            uri=True,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        return _Connection(connection)
+
+    def close(self):
+        self.pool.close()
+
+    def select_query(
+        self, fields, from_stmt, where_stmt, values, conv=None, target_fields=None
+    ):
+        names = target_fields or [conv(f) if conv else f for f in fields]
+        with self.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {', '.join(fields)} FROM {from_stmt} WHERE {where_stmt}",
+                values,
+            )
+            return [dict(zip(names, row)) for row in cursor]
+
+    def execute_statements(self, statements):
+        with self.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def _get_locations(self, identifier, include_ltp):
+        return self.select_query(
+            ["L.location_url", "IL.isFailover"],
+            from_stmt="identifier I JOIN identifier_location IL ON I.identifier_id = IL.identifier_id JOIN location L ON L.location_id = IL.location_id",
+            where_stmt="I.identifier_value = %(identifier)s"
+            + ("" if include_ltp else " AND IL.isFailover = 0")
+            + " ORDER BY IL.location_id",
+            values=dict(identifier=unfragment(identifier)),
+            target_fields=["uri", "ltp"],
+        )
+
+    def add_nbn_locations(self, identifier, locations, user):
+        self.add_nbn_locations_batch([(identifier, locations)], user)
+
+    def delete_nbn_locations(self, identifier, user):
+        try:
+            with self.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM `identifier_location` WHERE `isFailover` = %s AND `identifier_id` IN (SELECT `identifier_id` FROM `identifier` WHERE `identifier_value` = %s)",
+                    [int(bool(user["isLTP"])), unfragment(identifier)],
+                )
+        finally:
+            self._invalidate_locations([identifier])
+
+    def has_location_hash(self):
+        # location_url has a UNIQUE index of its own; SQLite has no key
+        # length limit that would require the hash
+        return False
+
+    def add_location_hash(self):
+        return False
+
+    def has_registrant_index(self):
+        # Part of SCHEMA
+        return True
+
+    def add_registrant_index(self):
+        return False
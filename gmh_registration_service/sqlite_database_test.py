@@ -0,0 +1,207 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import sqlite3
+
+from unittest.mock import patch
+
+import pytest
+
+from .sqlite_database import SQLiteDatabase, _Cursor, translate
+from .test_utils import database
+
+NBN = "urn:nbn:nl:ui:42-DEADC0FFEE"
+URL = "https://deadc0ff.ee"
+
+
+def insert_user(database, token="TOKEN", isLTP=False, groupid="GROUP_ID"):
+    with database.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO registrant (registrant_groupid, prefix, isLTP) VALUES (%(groupid)s, %(prefix)s, %(isLTP)s)",
+            dict(groupid=groupid, prefix="urn:nbn:nl:ui:42-", isLTP=isLTP),
+        )
+        cursor.execute(
+            "INSERT INTO credentials (registrant_id, username, password, token) VALUES (%s, %s, %s, %s)",
+            [cursor.lastrowid, groupid, b"hashed", token],
+        )
+    return database.get_user_by_token(token)
+
+
+def test_translate():
+    assert (
+        translate("SELECT a FROM t WHERE b = %(b)s AND c IN (%s, %s) FOR UPDATE")
+        == "SELECT a FROM t WHERE b = :b AND c IN (?, ?)"
+    )
+    assert translate("START TRANSACTION") == "BEGIN IMMEDIATE"
+    assert translate("TRUNCATE TABLE identifier") == "DELETE FROM identifier"
+    assert translate("SET FOREIGN_KEY_CHECKS = 0") == "PRAGMA foreign_keys = OFF"
+
+
+def test_users_and_credentials(database):
+    user = insert_user(database)
+    assert user["registrant_groupid"] == "GROUP_ID"
+    assert user["prefix"] == "urn:nbn:nl:ui:42-"
+    assert database.get_user_by_token("OTHER") is None
+    assert database.get_credentials_by_username("GROUP_ID") == dict(
+        credentials_id=user["credentials_id"], password="hashed"
+    )
+    # Case-insensitive, as with the MySQL collation
+    assert database.get_credentials_by_username("group_id") == dict(
+        credentials_id=user["credentials_id"], password="hashed"
+    )
+    assert database.get_registrant_id_by_groupid("group_id") == user["registrant_id"]
+
+    database.update_token("NEW", user["credentials_id"])
+    assert database.get_user_by_token("TOKEN") is None
+    assert database.get_user_by_token("NEW") == user
+
+
+def test_truncate_restarts_ids(database):
+    insert_user(database)
+    database.execute_statements(
+        ["SET FOREIGN_KEY_CHECKS = 0"]
+        + [f"TRUNCATE TABLE {table}" for table in ("registrant", "credentials")]
+        + ["SET FOREIGN_KEY_CHECKS = 1"]
+    )
+    user = insert_user(database)
+    assert (user["registrant_id"], user["credentials_id"]) == (1, 1)
+
+
+def test_locations(database):
+    user = insert_user(database)
+    ltp_user = insert_user(database, token="LTP", isLTP=True, groupid="ltp")
+
+    assert database.get_locations(NBN, True) == []
+    database.add_nbn_locations(NBN, [URL], user)
+    assert database.is_resolvable_identifier(NBN)
+    assert database.get_locations(NBN, False) == [dict(uri=URL, ltp=0)]
+
+    assert database.update_nbn_locations(NBN, [URL + "/ltp"], ltp_user)
+    assert database.get_locations(NBN, False) == [dict(uri=URL, ltp=0)]
+    assert database.get_locations(NBN, True) == [
+        dict(uri=URL, ltp=0),
+        dict(uri=URL + "/ltp", ltp=1),
+    ]
+    assert database.get_locations_with_ltp_access(
+        NBN, ltp_user["registrant_id"]
+    ) == dict(
+        locations=[dict(uri=URL, ltp=0), dict(uri=URL + "/ltp", ltp=1)],
+        has_ltp=True,
+    )
+    assert database.get_nbn_by_location(URL) == [dict(identifier_value=NBN)]
+
+    database.delete_nbn_locations(NBN, ltp_user)
+    assert database.get_locations(NBN, True) == [dict(uri=URL, ltp=0)]
+
+
+def test_update_with_existing_location(database):
+    user = insert_user(database)
+    database.add_nbn_locations(f"{NBN}-other", [f"{URL}/old"], user)
+    assert not database.update_nbn_locations(NBN, [f"{URL}/new", f"{URL}/old"], user)
+
+    statements = []
+    execute = _Cursor.execute
+    with patch.object(
+        _Cursor,
+        "execute",
+        lambda self, operation, params=None: statements.append(operation)
+        or execute(self, operation, params),
+    ):
+        assert database.update_nbn_locations(NBN, [f"{URL}/new", f"{URL}/old"], user)
+    assert not [each for each in statements if each.startswith(("INSERT", "DELETE"))]
+    assert database.get_locations(NBN, False) == [
+        dict(uri=f"{URL}/old", ltp=0),
+        dict(uri=f"{URL}/new", ltp=0),
+    ]
+
+    assert database.update_nbn_locations(NBN, [f"{URL}/old", f"{URL}/3"], user)
+    assert database.get_locations(NBN, False) == [
+        dict(uri=f"{URL}/old", ltp=0),
+        dict(uri=f"{URL}/3", ltp=0),
+    ]
+
+
+def test_batch(database):
+    user = insert_user(database)
+    database.add_nbn_locations_batch(
+        [(f"{NBN}-{i}", [f"{URL}/{i}", f"{URL}/{i}/b"]) for i in range(3)], user
+    )
+    assert database.get_resolvable_identifiers([f"{NBN}-1", f"{NBN}-9"]) == {f"{NBN}-1"}
+    assert database.get_locations_by_identifiers([f"{NBN}-2"], False) == {
+        f"{NBN}-2": [dict(uri=f"{URL}/2", ltp=0), dict(uri=f"{URL}/2/b", ltp=0)]
+    }
+
+
+def test_mixed_case_identifiers(database):
+    user = insert_user(database)
+    database.add_nbn_locations_batch([(NBN, [f"{URL}/1"])], user)
+    # The identifier column is case-insensitive, so these are the same row
+    database.add_nbn_locations_batch(
+        [(NBN.upper(), [f"{URL}/2"]), (NBN.lower(), [f"{URL}/3"])], user
+    )
+    database.update_nbn_locations(NBN.lower(), [f"{URL}/1", f"{URL}/4"], user)
+    assert database.get_locations(NBN, False) == [
+        dict(uri=f"{URL}/1", ltp=0),
+        dict(uri=f"{URL}/4", ltp=0),
+    ]
+    with database.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM identifier")
+        assert cursor.fetchone() == (1,)
+
+
+def test_registrant_identifiers(database):
+    user = insert_user(database)
+    other = insert_user(database, token="OTHER", groupid="other")
+    database.add_nbn_locations_batch(
+        [(f"{NBN}-{i}", [f"{URL}/{i}"]) for i in range(5)], user
+    )
+    database.add_nbn_locations(f"{NBN}-other", [URL], other)
+
+    page = database.get_registrant_identifiers(user["registrant_id"], limit=2)
+    assert [row["identifier"] for row in page] == [f"{NBN}-0", f"{NBN}-1"]
+    page = database.get_registrant_identifiers(
+        user["registrant_id"], after=page[-1]["identifier_id"], limit=10
+    )
+    assert [row["identifier"] for row in page] == [f"{NBN}-{i}" for i in range(2, 5)]
+    assert (
+        database.get_registrant_identifiers(
+            user["registrant_id"], after=page[-1]["identifier_id"]
+        )
+        == []
+    )
+
+
+def test_read_only_snapshot(database):
+    user = insert_user(database)
+    database.add_nbn_locations(NBN, [URL], user)
+
+    snapshot = SQLiteDatabase(database.path, read_only=True)
+    try:
+        assert snapshot.get_locations(NBN, False) == [dict(uri=URL, ltp=0)]
+        with pytest.raises(sqlite3.OperationalError):
+            snapshot.add_nbn_locations(NBN + "-2", [URL], user)
+    finally:
+        snapshot.close()
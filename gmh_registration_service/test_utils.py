@@ -32,24 +32,66 @@ from gmh_registration_service.server import create_app, setup_environment
 from starlette.testclient import TestClient
 from collections import namedtuple
 
-import bcrypt
+from gmh_registration_service.passwords import hash_password
+from gmh_registration_service.sqlite_database import SQLiteDatabase
 
 Environment = namedtuple(
     "Environment",
-    ["client", "actions", "templates", "database"],
+    ["client", "actions", "templates", "database", "metrics", "lifespan"],
 )
 
 
+class Clock:
+    """A timer for tests that returns `now` until it is changed."""
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A fresh SQLite database for tests of the database layer."""
+    database = SQLiteDatabase(tmp_path / "gmh.sqlite")
+    yield database
+    database.close()
+
+
+def count_queries(monkeypatch, database):
+    """Returns the list to which every select_query of database appends
+    its arguments."""
+    queries = []
+    select_query = database.select_query
+
+    def counting_select_query(*args, **kwargs):
+        queries.append(args)
+        return select_query(*args, **kwargs)
+
+    monkeypatch.setattr(database, "select_query", counting_select_query)
+    return queries
+
+
 @pytest.fixture(scope="session")
 async def environment_session(tmp_path_factory):
     data_path = tmp_path_factory.mktemp("data")
     config_path = data_path / "config"
     config_path.mkdir(parents=True)
+    import json
     import shutil
 
-    if not (global_config_path / "database.config").is_file():
-        raise RuntimeError(f"database.config not found in {global_config_path}")
-    shutil.copy(global_config_path / "database.config", config_path / "database.conf")
+    # Many tests expect a 401; do not throttle the test client for that
+    config_json = {"auth_throttle": {"rate": 1000, "burst": 1000}}
+
+    # Without a MySQL database.config the tests run on SQLite
+    if (global_config_path / "database.config").is_file():
+        shutil.copy(
+            global_config_path / "database.config", config_path / "database.conf"
+        )
+    else:
+        config_json["database"] = {"backend": "sqlite"}
+    (config_path / "config.json").write_text(json.dumps(config_json))
 
     config = Config(data_path, development=True)
     env = await setup_environment(config)
@@ -75,6 +117,7 @@ async def environment(environment_session):
         + [f"TRUNCATE TABLE {table_name}" for table_name in all_tables]
         + ["SET FOREIGN_KEY_CHECKS = 1"]
     )
+    database.clear_caches()
     yield environment_session
 
 
@@ -88,7 +131,7 @@ def insert_token(
     isLTP=False,
 ):
 
-    hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+    hashed_password = hash_password(password)
 
     with database.cursor() as cursor:
         cursor.execute(
@@ -0,0 +1,111 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+USER_FIELDS = [
+    "registrant_id",
+    "registrant_groupid",
+    "prefix",
+    "isLTP",
+    "credentials_id",
+]
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class TokenSigner:
+    """Issues and verifies self-contained access tokens.
+
+    A token is "v1.<payload>.<signature>": the user fields plus issue and
+    expiry time, signed with HMAC-SHA256. Verification needs no database;
+    issuing a new token for the same credentials revokes the older ones
+    through a small in-memory list (per process)."""
+
+    PREFIX = "v1."
+
+    def __init__(self, secret, ttl=3600, timer=time.time):
+        self._secret = secret.encode("utf-8")
+        self.ttl = ttl
+        self._timer = timer
+        self._revoked_before = {}
+        self._lock = threading.Lock()
+
+    def is_signed(self, token):
+        return token.startswith(self.PREFIX)
+
+    def sign(self, user):
+        now = self._timer()
+        payload = {field: user[field] for field in USER_FIELDS}
+        payload.update(iat=now, exp=now + self.ttl)
+        body = self.PREFIX + _b64encode(
+            json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        )
+        return body + "." + self._signature(body)
+
+    def verify(self, token):
+        body, _, signature = token.rpartition(".")
+        # compare_digest only takes str of ASCII characters, so compare bytes
+        if not body.startswith(self.PREFIX) or not hmac.compare_digest(
+            signature.encode("utf-8"), self._signature(body).encode("ascii")
+        ):
+            return None
+        try:
+            payload = json.loads(_b64decode(body[len(self.PREFIX) :]))
+        except ValueError:
+            return None
+
+        if payload["exp"] <= self._timer():
+            return None
+        if payload["iat"] < self._revoked_before.get(payload["credentials_id"], 0):
+            return None
+        return {field: payload[field] for field in USER_FIELDS}
+
+    def revoke(self, credentials_id):
+        """Revokes all tokens issued until now for credentials_id."""
+        now = self._timer()
+        with self._lock:
+            self._revoked_before[credentials_id] = now
+            # Entries older than ttl only guard tokens that have expired anyway
+            for each, revoked in list(self._revoked_before.items()):
+                if revoked < now - self.ttl:
+                    del self._revoked_before[each]
+
+    def _signature(self, body):
+        return _b64encode(
+            hmac.new(self._secret, body.encode("utf-8"), hashlib.sha256).digest()
+        )
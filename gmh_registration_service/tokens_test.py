@@ -0,0 +1,76 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from .test_utils import Clock
+from .tokens import TokenSigner
+
+USER = dict(
+    registrant_id=1,
+    registrant_groupid="GROUP_ID",
+    prefix="urn:nbn:nl:ui:42-",
+    isLTP=0,
+    credentials_id=3,
+)
+
+
+def test_sign_and_verify():
+    signer = TokenSigner("secret")
+    token = signer.sign(USER)
+    assert signer.is_signed(token)
+    assert not signer.is_signed("OPAQUE_TOKEN")
+    assert signer.verify(token) == USER
+
+
+def test_tampered_or_foreign_tokens():
+    signer = TokenSigner("secret")
+    token = signer.sign(USER)
+    body, signature = token.rsplit(".", 1)
+    assert signer.verify(body + "." + signature[::-1]) is None
+    assert signer.verify(TokenSigner("other").sign(USER)) is None
+    assert signer.verify("v1.garbage") is None
+    assert signer.verify("v1.abc.\xe9") is None
+    assert signer.verify(body + "\xe9." + signature) is None
+
+
+def test_expiry():
+    clock = Clock(1000.0)
+    signer = TokenSigner("secret", ttl=10, timer=clock)
+    token = signer.sign(USER)
+    clock.now += 9
+    assert signer.verify(token) == USER
+    clock.now += 1
+    assert signer.verify(token) is None
+
+
+def test_revoke():
+    clock = Clock(1000.0)
+    signer = TokenSigner("secret", timer=clock)
+    token = signer.sign(USER)
+    clock.now += 1
+    signer.revoke(USER["credentials_id"])
+    new_token = signer.sign(USER)
+    assert signer.verify(token) is None
+    assert signer.verify(new_token) == USER
@@ -24,13 +24,22 @@
 #
 ## end license ##
 
+import hashlib
+import json
 import re
 
-from .messages import INVALID_AUTH_INFO, BAD_REQUEST
+from .messages import (
+    INVALID_AUTH_INFO,
+    BAD_REQUEST,
+    TOO_MANY_REQUESTS,
+    URN_NBN_FORBIDDEN2,
+    URN_NBN_LOCATION_INVALID,
+    URN_NBN_CONFLICT,
+    SUCCESS_CREATED_NEW,
+)
 
 from starlette.exceptions import HTTPException
 
-
 urnnbn_regex = re.compile(
     "^[uU][rR][nN]:[nN][bB][nN]:[nN][lL](:([a-zA-Z]{2}))?:\\d{2}-.+"
 )
@@ -52,18 +61,101 @@ def unfragment(identifier):
     return identifier.split("#", 1)[0]
 
 
-def get_user_by_token(request, database):
+def validate_identifier_and_locations(user, identifier, locations):
+    # Validate identifier
+    if not valid_urn_nbn(identifier):
+        raise HTTPException(status_code=400, detail=URN_NBN_LOCATION_INVALID)
+
+    # Validate locations
+    for location in locations:
+        if not valid_location(location):
+            raise HTTPException(status_code=400, detail=URN_NBN_LOCATION_INVALID)
+
+    # Prefix match registrant prefix with identifier; Forbidden is no match and user is not LTP
     if (
-        authorization := request.headers.get("authorization")
-    ) is None or not authorization.startswith("Bearer "):
+        not identifier.lower().startswith(user["prefix"].lower())
+        and not bool(user["isLTP"]) is True
+    ):
+        raise HTTPException(status_code=403, detail=URN_NBN_FORBIDDEN2)
+
+
+def check_batch_items(user, items):
+    """Validates {"identifier": ..., "locations": [...]} items. Returns a
+    result per item and {key: (result, identifier, locations)} for the
+    valid ones, whose status is set by select_new_items. identifier_value
+    is case-insensitive, so the key is the casefolded identifier and case
+    variants of an identifier are a conflict."""
+    results = []
+    valid = {}
+    for item in items:
+        item = item if isinstance(item, dict) else {}
+        identifier = item.get("identifier")
+        locations = item.get("locations")
+        result = dict(identifier=identifier)
+        results.append(result)
+
+        if not isinstance(identifier, str) or not (
+            isinstance(locations, list)
+            and all(isinstance(location, str) for location in locations)
+        ):
+            result.update(status=400, message=URN_NBN_LOCATION_INVALID)
+            continue
+        try:
+            validate_identifier_and_locations(user, identifier, locations)
+        except HTTPException as e:
+            result.update(status=e.status_code, message=e.detail)
+            continue
+        identifier = unfragment(identifier)
+        if (key := identifier.casefold()) in valid:
+            result.update(status=409, message=URN_NBN_CONFLICT)
+            continue
+        valid[key] = (result, identifier, locations)
+    return results, valid
+
+
+def batch_identifiers(valid):
+    """The identifiers of the valid items from check_batch_items."""
+    return [identifier for _, identifier, _ in valid.values()]
+
+
+def select_new_items(valid, resolvable):
+    """Returns the (identifier, locations) of the valid items to add; those
+    that are resolvable already, in any case, are a conflict."""
+    resolvable = {identifier.casefold() for identifier in resolvable}
+    to_add = []
+    for key, (result, identifier, locations) in valid.items():
+        if key in resolvable:
+            result.update(status=409, message=URN_NBN_CONFLICT)
+        else:
+            result.update(status=201, message=SUCCESS_CREATED_NEW)
+            to_add.append((identifier, locations))
+    return to_add
+
+
+def client_address(request):
+    return request.client.host if request.client else "unknown"
+
+
+async def get_user_by_token(request, database, rate_limiter=None):
+    # Every 401 takes a token from the client's bucket; a client without
+    # tokens left gets a 429 before its token is even looked up.
+    client = client_address(request)
+    if rate_limiter is not None and not rate_limiter.available(client):
         raise HTTPException(
-            status_code=401,
-            detail=INVALID_AUTH_INFO,
-            headers={"WWW-Authenticate": "Bearer"},
+            status_code=429,
+            detail=TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(rate_limiter.retry_after(client))},
         )
 
-    _, token = authorization.split(" ", 1)
-    if (user := database.get_user_by_token(token)) is None:
+    token = None
+    if (
+        authorization := request.headers.get("authorization")
+    ) is not None and authorization.startswith("Bearer "):
+        _, token = authorization.split(" ", 1)
+
+    if token is None or (user := await database.get_user_by_token(token)) is None:
+        if rate_limiter is not None:
+            rate_limiter.consume(client)
         raise HTTPException(
             status_code=401,
             detail=INVALID_AUTH_INFO,
@@ -72,6 +164,23 @@ def get_user_by_token(request, database):
     return user
 
 
+def check_registrant_limit(registrant_limits, user, access, cost=1):
+    """Takes `cost` from the `access` ("read" or "write") budget of the
+    user's registrant; raises a 429 when it is exhausted."""
+    if registrant_limits is None:
+        return
+    if (
+        retry_after := registrant_limits.consume(
+            user["registrant_groupid"], access, cost
+        )
+    ) is not None:
+        raise HTTPException(
+            status_code=429,
+            detail=TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
 async def parse_body_as_json(request):
     if request.headers.get("content-type") != "application/json":
         raise HTTPException(status_code=400, detail=BAD_REQUEST)
@@ -81,3 +190,51 @@ async def parse_body_as_json(request):
     except:
         raise HTTPException(status_code=400, detail=BAD_REQUEST)
     return body
+
+
+def parse_ndjson_line(line):
+    """Returns the JSON value on a line of NDJSON, or None when the line is
+    not valid JSON; a None item is reported as invalid like any other."""
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+async def iter_ndjson(chunks, max_line_bytes=1 << 20):
+    """Yields (line number, item) for the non-blank lines of a stream of
+    NDJSON bytes. Only the current line is buffered; a line longer than
+    `max_line_bytes` is dropped and gives a None item."""
+    buffer = b""
+    line_number = 0
+    overlong = False
+    async for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            line_number += 1
+            if overlong:
+                overlong = False
+                yield line_number, None
+            elif line.strip():
+                yield line_number, parse_ndjson_line(line)
+        if len(buffer) > max_line_bytes:
+            overlong = True
+            buffer = b""
+    if overlong:
+        yield line_number + 1, None
+    elif buffer.strip():
+        yield line_number + 1, parse_ndjson_line(buffer)
+
+
+def locations_etag(locations):
+    digest = hashlib.sha256(
+        json.dumps([location["uri"] for location in locations]).encode("utf-8")
+    ).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request, etag):
+    if (if_none_match := request.headers.get("if-none-match")) is None:
+        return False
+    candidates = [each.strip().removeprefix("W/") for each in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
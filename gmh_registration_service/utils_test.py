@@ -0,0 +1,113 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import pytest
+
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+
+from .messages import INVALID_AUTH_INFO, TOO_MANY_REQUESTS
+from .ratelimit import RateLimiter, RegistrantLimits
+from .utils import check_registrant_limit, get_user_by_token, iter_ndjson
+
+
+class Database:
+    def __init__(self):
+        self.lookups = 0
+
+    async def get_user_by_token(self, token):
+        self.lookups += 1
+        return dict(registrant_groupid="group") if token == "GOOD" else None
+
+
+def _request(token=None, client="10.0.0.1"):
+    headers = [] if token is None else [(b"authorization", f"Bearer {token}".encode())]
+    return Request(dict(type="http", headers=headers, client=(client, 1234)))
+
+
+async def test_throttles_clients_after_401s():
+    database = Database()
+    limiter = RateLimiter(rate=0.01, burst=2)
+
+    for request in (_request("STALE"), _request()):
+        with pytest.raises(HTTPException) as e:
+            await get_user_by_token(request, database, limiter)
+        assert e.value.status_code == 401
+        assert e.value.detail == INVALID_AUTH_INFO
+
+    # Throttled without looking up the token, even a valid one
+    with pytest.raises(HTTPException) as e:
+        await get_user_by_token(_request("GOOD"), database, limiter)
+    assert e.value.status_code == 429
+    assert e.value.detail == TOO_MANY_REQUESTS
+    assert e.value.headers["Retry-After"] == "100"
+    assert database.lookups == 1
+
+    # Other clients are not affected
+    user = await get_user_by_token(_request("GOOD", "10.0.0.2"), database, limiter)
+    assert user == dict(registrant_groupid="group")
+
+
+async def test_valid_tokens_are_not_counted():
+    limiter = RateLimiter(rate=0.01, burst=1)
+    for _ in range(3):
+        await get_user_by_token(_request("GOOD"), Database(), limiter)
+    assert limiter.available("10.0.0.1")
+
+
+def test_check_registrant_limit():
+    limits = RegistrantLimits(write=dict(rate=0.5, burst=3))
+    user = dict(registrant_groupid="group")
+    check_registrant_limit(limits, user, "write", cost=3)
+    check_registrant_limit(limits, user, "read", cost=100)
+    with pytest.raises(HTTPException) as e:
+        check_registrant_limit(limits, user, "write")
+    assert e.value.status_code == 429
+    assert e.value.headers["Retry-After"] == "2"
+    check_registrant_limit(None, user, "write")
+
+
+async def test_iter_ndjson():
+    async def chunks(*chunks):
+        for chunk in chunks:
+            yield chunk
+
+    async def items(*args, **kwargs):
+        return [each async for each in iter_ndjson(chunks(*args), **kwargs)]
+
+    assert await items(b'{"a": 1}\n[2', b"]\n\n", b"invalid\n3") == [
+        (1, {"a": 1}),
+        (2, [2]),
+        (4, None),
+        (5, 3),
+    ]
+    assert await items(b"1\n") == [(1, 1)]
+    assert await items(b"1\n2222", b"2222", b"2\n3\n", max_line_bytes=4) == [
+        (1, 1),
+        (2, None),
+        (3, 3),
+    ]
+    assert await items(b"1\n2222", b"2222", max_line_bytes=4) == [(1, 1), (2, None)]
@@ -26,4 +26,7 @@
 
 from swl.utils import Views
 
-VIEWS = Views(__name__, ["general", "openapi", "token", "location", "nbn"])
+VIEWS = Views(
+    __name__,
+    ["general", "openapi", "token", "location", "nbn", "metrics", "health", "jobs"],
+)
@@ -0,0 +1,124 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import asyncio
+import json
+
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+from gmh_registration_service.messages import (
+    BAD_REQUEST,
+    JOB_NOT_FOUND,
+    PAYLOAD_TOO_LARGE,
+)
+from gmh_registration_service.utils import (
+    check_registrant_limit,
+    get_user_by_token,
+    parse_body_as_json,
+)
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+async def job_create(
+    request, database, jobs, rate_limiter, registrant_limits, **kwargs
+):
+    user = await get_user_by_token(request, database, rate_limiter)
+    check_registrant_limit(registrant_limits, user, "write")
+    logger.info(f"{user['registrant_groupid']!r} requests {request.url.path!r}")
+
+    content_type = request.headers.get("content-type")
+    if content_type not in ("application/json", "application/x-ndjson"):
+        raise HTTPException(status_code=400, detail=BAD_REQUEST)
+    try:
+        content_length = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=BAD_REQUEST)
+    if content_length > jobs.max_bytes:
+        raise HTTPException(status_code=413, detail=PAYLOAD_TOO_LARGE)
+
+    loop = asyncio.get_running_loop()
+    job_id = await loop.run_in_executor(None, jobs.create, user)
+    try:
+        f = await loop.run_in_executor(None, jobs.open_input, job_id)
+        with f:
+            if content_type == "application/json":
+                body = await parse_body_as_json(request)
+                if not isinstance(body, list):
+                    raise HTTPException(status_code=400, detail=BAD_REQUEST)
+                data = "".join(json.dumps(item) + "\n" for item in body)
+                await loop.run_in_executor(None, f.write, data.encode("utf-8"))
+            else:
+                size = 0
+                async for chunk in request.stream():
+                    size += len(chunk)
+                    if size > jobs.max_bytes:
+                        raise HTTPException(status_code=413, detail=PAYLOAD_TOO_LARGE)
+                    await loop.run_in_executor(None, f.write, chunk)
+        await loop.run_in_executor(None, jobs.submit, job_id)
+    except:
+        await loop.run_in_executor(None, jobs.discard, job_id)
+        raise
+
+    url = f"/nbn/jobs/{job_id}"
+    return JSONResponse(
+        dict(id=job_id, status=url), status_code=202, headers={"Location": url}
+    )
+
+
+async def job_status(
+    request, database, jobs, rate_limiter, registrant_limits, **kwargs
+):
+    user = await get_user_by_token(request, database, rate_limiter)
+    check_registrant_limit(registrant_limits, user, "read")
+
+    status = await asyncio.get_running_loop().run_in_executor(
+        None, jobs.get, request.path_params["id"]
+    )
+    # Jobs of other registrants do not exist as far as this one knows
+    if status is None or status["registrant_groupid"] != user["registrant_groupid"]:
+        raise HTTPException(status_code=404, detail=JOB_NOT_FOUND)
+    return JSONResponse(_job_progress(status, time.time()))
+
+
+def _job_progress(status, now):
+    """The status as reported to the registrant, with the throughput in
+    items per second."""
+    progress = {
+        key: value
+        for key, value in status.items()
+        if key not in ("credentials_id", "line", "pending")
+    }
+    progress["throughput"] = None
+    if status["started"] is not None:
+        elapsed = (status["finished"] or now) - status["started"]
+        if elapsed > 0:
+            progress["throughput"] = round(status["processed"] / elapsed, 1)
+    return progress
@@ -0,0 +1,142 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import json
+
+from gmh_registration_service.messages import (
+    BAD_REQUEST,
+    JOB_NOT_FOUND,
+    PAYLOAD_TOO_LARGE,
+    URN_NBN_FORBIDDEN2,
+)
+from gmh_registration_service.test_utils import (
+    environment,
+    environment_session,
+    insert_token,
+)
+
+URL = "https://deadc0ff.ee"
+
+
+def test_jobs(environment):
+    client = environment.client
+    jobs = environment.lifespan.jobs
+    TOKEN = "THE_TOKEN"
+    insert_token(environment.database, TOKEN, prefix="urn:nbn:nl:ui:42-")
+    insert_token(
+        environment.database,
+        "OTHER_TOKEN",
+        groupid="OTHER",
+        username="alice",
+        prefix="urn:nbn:nl:ui:43-",
+    )
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+
+    response = client.post("/nbn/jobs", json=[])
+    assert response.status_code == 401
+
+    response = client.post("/nbn/jobs", headers=headers, json={})
+    assert response.status_code == 400
+    assert response.text == BAD_REQUEST
+
+    response = client.post(
+        "/nbn/jobs",
+        headers=headers | {"Content-Type": "application/json", "Content-Length": "x"},
+        content=b"[]",
+    )
+    assert response.status_code == 400
+    assert response.text == BAD_REQUEST
+
+    response = client.post(
+        "/nbn/jobs",
+        headers=headers,
+        json=[
+            {"identifier": "urn:nbn:nl:ui:42-1", "locations": [URL]},
+            {"identifier": "urn:nbn:nl:ui:43-1", "locations": [URL]},
+        ],
+    )
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    assert response.headers["Location"] == f"/nbn/jobs/{job_id}"
+
+    response = client.get(f"/nbn/jobs/{job_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["state"] == "queued"
+    assert response.json()["throughput"] is None
+
+    # The test client does not run the lifespan, so the worker is not running
+    jobs.process(job_id)
+    response = client.get(f"/nbn/jobs/{job_id}", headers=headers)
+    status = response.json()
+    assert (status["state"], status["processed"], status["succeeded"]) == (
+        "done",
+        2,
+        1,
+    )
+    assert status["errors"] == [
+        dict(
+            line=2,
+            identifier="urn:nbn:nl:ui:43-1",
+            status=403,
+            message=URN_NBN_FORBIDDEN2,
+        )
+    ]
+    assert "credentials_id" not in status
+    assert environment.database.is_resolvable_identifier("urn:nbn:nl:ui:42-1")
+
+    # Other registrants cannot see the job
+    response = client.get(
+        f"/nbn/jobs/{job_id}", headers={"Authorization": "Bearer OTHER_TOKEN"}
+    )
+    assert response.status_code == 404
+    assert response.text == JOB_NOT_FOUND
+
+
+def test_jobs_ndjson_upload(environment, monkeypatch):
+    client = environment.client
+    jobs = environment.lifespan.jobs
+    TOKEN = "THE_TOKEN"
+    insert_token(environment.database, TOKEN, prefix="urn:nbn:nl:ui:42-")
+    headers = {
+        "Authorization": f"Bearer {TOKEN}",
+        "Content-Type": "application/x-ndjson",
+    }
+    content = "".join(
+        json.dumps({"identifier": f"urn:nbn:nl:ui:42-{n}", "locations": [URL]}) + "\n"
+        for n in range(10)
+    )
+
+    response = client.post("/nbn/jobs", headers=headers, content=content)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    jobs.process(job_id)
+    assert jobs.get(job_id)["succeeded"] == 10
+
+    monkeypatch.setattr(jobs, "max_bytes", 100)
+    response = client.post("/nbn/jobs", headers=headers, content=content)
+    assert response.status_code == 413
+    assert response.text == PAYLOAD_TOO_LARGE
+    assert list(jobs.pending()) == []
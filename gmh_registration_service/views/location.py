@@ -28,22 +28,23 @@ from starlette.responses import JSONResponse
 from starlette.exceptions import HTTPException
 
 from gmh_registration_service.messages import NOT_FOUND
-from gmh_registration_service.utils import get_user_by_token
+from gmh_registration_service.utils import check_registrant_limit, get_user_by_token
 
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-async def location(request, database, **kwargs):
+async def location(request, database, rate_limiter, registrant_limits, **kwargs):
     # Raises HTTPException if no authorization or valid user
-    user = get_user_by_token(request, database)
+    user = await get_user_by_token(request, database, rate_limiter)
+    check_registrant_limit(registrant_limits, user, "read")
     logger.info(f"{user['registrant_groupid']!r} requests {request.url.path!r}")
 
     location = request.path_params.get("location")
     if len(location.strip()) == 0:
         raise HTTPException(status_code=404, detail=NOT_FOUND)
 
-    if len(nbns := database.get_nbn_by_location(location)) == 0:
+    if len(nbns := await database.get_nbn_by_location(location)) == 0:
         raise HTTPException(status_code=404, detail=NOT_FOUND)
     return JSONResponse([each["identifier_value"] for each in nbns])
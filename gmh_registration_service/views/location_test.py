@@ -24,6 +24,9 @@
 #
 ## end license ##
 import logging
+import pytest
+
+from gmh_registration_service.sqlite_database import SQLiteDatabase
 from gmh_registration_service.test_utils import (
     environment,
     environment_session,
@@ -96,3 +99,60 @@ async def test_found(environment):
     )
     assert response.status_code == 200
     assert response.json() == ["URN:NBN:"]
+
+
+def _drop_location_hash(database):
+    database.execute_statements(
+        [
+            "ALTER TABLE `location` DROP INDEX `location_url_hash`, DROP COLUMN `location_url_hash`"
+        ]
+    )
+    database._has_location_hash = None
+
+
+@pytest.fixture
+def without_location_hash(environment):
+    """Removes the location_url_hash migration from the shared test database
+    for the test, and restores the state it was in afterwards."""
+    database = environment.database
+    if isinstance(database, SQLiteDatabase):
+        pytest.skip("SQLite looks up location_url without hash")
+    migrated = database.has_location_hash()
+    if migrated:
+        _drop_location_hash(database)
+    yield database
+    if migrated:
+        database.add_location_hash()
+    elif database.has_location_hash():
+        _drop_location_hash(database)
+
+
+async def test_found_by_location_hash(environment, without_location_hash):
+    TOKEN = "THE_SECRET_TOKEN"
+    database = without_location_hash
+    registrant_id = insert_token(database, TOKEN)
+    insert_location(
+        database,
+        identifier="URN:NBN:",
+        location="https://seecr.nl",
+        registrant=registrant_id,
+    )
+
+    def get_location():
+        return environment.client.get(
+            "/location/" + quote("https://seecr.nl", safe=""),
+            headers={"Authorization": f"Bearer {TOKEN}"},
+        )
+
+    # Before the migration
+    assert not database.has_location_hash()
+    response = get_location()
+    assert response.status_code == 200
+    assert response.json() == ["URN:NBN:"]
+
+    # The migration backfills the hash of the existing location
+    assert database.add_location_hash()
+    assert database.has_location_hash()
+    response = get_location()
+    assert response.status_code == 200
+    assert response.json() == ["URN:NBN:"]
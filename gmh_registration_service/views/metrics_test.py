@@ -0,0 +1,52 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from gmh_registration_service.test_utils import (
+    environment,
+    environment_session,
+    insert_token,
+)
+
+
+async def test_metrics(environment):
+    TOKEN = "THE_TOKEN"
+    insert_token(environment.database, TOKEN)
+    environment.client.get("/location/x", headers={"Authorization": f"Bearer {TOKEN}"})
+
+    response = environment.client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'gmh_http_requests_total{route="/location/{location:path}",method="GET",status="404"}'
+        in response.text
+    )
+    assert 'gmh_database_call_duration_seconds_count{method="get_user_by_token"}' in (
+        response.text
+    )
+    assert 'gmh_database_call_duration_seconds_count{method="get_nbn_by_location"}' in (
+        response.text
+    )
+    assert 'gmh_database_pool_wait_seconds_total{pool="primary"} ' in response.text
@@ -24,27 +24,46 @@
 #
 ## end license ##
 
-from starlette.responses import PlainTextResponse, JSONResponse
+import asyncio
+import base64
+import functools
+import json
+import tempfile
+
+from starlette.concurrency import iterate_in_threadpool
+from starlette.responses import (
+    PlainTextResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from starlette.exceptions import HTTPException
 
 from gmh_registration_service.messages import (
     INVALID_AUTH_INFO,
     BAD_REQUEST,
     URN_NBN_FORBIDDEN,
-    URN_NBN_FORBIDDEN2,
     URN_NBN_INVALID,
-    URN_NBN_LOCATION_INVALID,
     URN_NBN_NOT_FOUND,
     URN_NBN_CONFLICT,
     SUCCESS_CREATED_NEW,
     SUCCESS_UPDATED,
+    TOO_MANY_REQUESTS,
 )
 
 from gmh_registration_service.utils import (
     valid_urn_nbn,
-    valid_location,
+    batch_identifiers,
+    check_batch_items,
+    check_registrant_limit,
     get_user_by_token,
+    iter_ndjson,
     parse_body_as_json,
+    select_new_items,
+    unfragment,
+    validate_identifier_and_locations,
+    locations_etag,
+    etag_matches,
 )
 
 import logging
@@ -52,28 +71,35 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-async def _nbn_get_locations_by_identifier(request, database, urn_nbn, format_answer):
-    user = get_user_by_token(request, database)
+async def _nbn_get_locations_by_identifier(
+    request, database, rate_limiter, registrant_limits, urn_nbn, format_answer
+):
+    user = await get_user_by_token(request, database, rate_limiter)
+    check_registrant_limit(registrant_limits, user, "read")
     logger.info(f"{user['registrant_groupid']!r} requests {request.url.path!r}")
 
     if not valid_urn_nbn(urn_nbn):
         raise HTTPException(status_code=400, detail=URN_NBN_INVALID)
 
-    if not urn_nbn.lower().startswith(
-        user["prefix"].lower()
-    ) and not database.has_ltp_location(identifier=urn_nbn, org_prefix=user["prefix"]):
+    # Authorization facts and locations in a single query
+    result = await database.get_locations_with_ltp_access(
+        identifier=urn_nbn, registrant_id=user["registrant_id"]
+    )
+
+    if not urn_nbn.lower().startswith(user["prefix"].lower()) and not result["has_ltp"]:
         raise HTTPException(status_code=403, detail=URN_NBN_FORBIDDEN)
 
-    if (
-        len(locations := database.get_locations(identifier=urn_nbn, include_ltp=True))
-        == 0
-    ):
+    if len(locations := result["locations"]) == 0:
         raise HTTPException(status_code=404, detail=URN_NBN_NOT_FOUND)
 
-    return JSONResponse(format_answer(urn_nbn, locations))
+    etag = locations_etag(locations)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
 
+    return JSONResponse(format_answer(urn_nbn, locations), headers={"ETag": etag})
 
-async def nbn_get(request, database, **kwargs):
+
+async def nbn_get(request, database, rate_limiter, registrant_limits, **kwargs):
     def format_answer(identifier, locations):
         return {
             "identifier": identifier,
@@ -81,71 +107,257 @@ async def nbn_get(request, database, **kwargs):
         }
 
     return await _nbn_get_locations_by_identifier(
-        request, database, request.path_params.get("identifier"), format_answer
+        request,
+        database,
+        rate_limiter,
+        registrant_limits,
+        request.path_params.get("identifier"),
+        format_answer,
     )
 
 
-async def nbn_get_locations(request, database, **kwargs):
+async def nbn_get_locations(
+    request, database, rate_limiter, registrant_limits, **kwargs
+):
     def format_answer(identifier, locations):
         return [location["uri"] for location in locations]
 
     return await _nbn_get_locations_by_identifier(
-        request, database, request.path_params.get("identifier"), format_answer
+        request,
+        database,
+        rate_limiter,
+        registrant_limits,
+        request.path_params.get("identifier"),
+        format_answer,
     )
 
 
-def _validate_identifier_and_locations(user, identifier, locations):
-    print("USER", user, flush=True)
-    # Validate identifier
-    if not valid_urn_nbn(identifier):
-        raise HTTPException(status_code=400, detail=URN_NBN_LOCATION_INVALID)
-
-    # Validate locations
-    for location in locations:
-        if not valid_location(location):
-            raise HTTPException(status_code=400, detail=URN_NBN_LOCATION_INVALID)
+async def nbn_lookup(
+    request, database, settings, rate_limiter, registrant_limits, **kwargs
+):
+    user = await get_user_by_token(request, database, rate_limiter)
+    logger.info(f"{user['registrant_groupid']!r} requests {request.url.path!r}")
+    body = await parse_body_as_json(request)
 
-    # Prefix match registrant prefix with identifier; Forbidden is no match and user is not LTP
     if (
-        not identifier.lower().startswith(user["prefix"].lower())
-        and not bool(user["isLTP"]) is True
+        not isinstance(body, list)
+        or len(body) > settings["max_batch_size"]
+        or not all(isinstance(identifier, str) for identifier in body)
     ):
-        raise HTTPException(status_code=403, detail=URN_NBN_FORBIDDEN2)
+        raise HTTPException(status_code=400, detail=BAD_REQUEST)
+    check_registrant_limit(registrant_limits, user, "read", cost=max(1, len(body)))
+
+    identifiers = list(dict.fromkeys(body))
+    invalid = [each for each in identifiers if not valid_urn_nbn(each)]
+    valid = [each for each in identifiers if valid_urn_nbn(each)]
+
+    foreign = [
+        each for each in valid if not each.lower().startswith(user["prefix"].lower())
+    ]
+    # The database returns the stored spelling of the case-insensitive
+    # identifier_value, so both sides are casefolded
+    ltp_identifiers = {
+        each.casefold()
+        for each in await database.get_ltp_identifiers(foreign, user["registrant_id"])
+    }
+    forbidden = set(
+        each for each in foreign if unfragment(each).casefold() not in ltp_identifiers
+    )
+
+    allowed = [each for each in valid if each not in forbidden]
+    found = {
+        identifier.casefold(): each
+        for identifier, each in (
+            await database.get_locations_by_identifiers(allowed, include_ltp=True)
+        ).items()
+    }
+
+    locations = {}
+    not_found = []
+    for identifier in allowed:
+        if (each := found.get(unfragment(identifier).casefold())) is None:
+            not_found.append(identifier)
+        else:
+            locations[identifier] = [location["uri"] for location in each]
+
+    return JSONResponse(
+        {
+            "locations": locations,
+            "not_found": not_found,
+            "forbidden": [each for each in valid if each in forbidden],
+            "invalid": invalid,
+        }
+    )
+
+
+async def nbn_list(
+    request, database, settings, rate_limiter, registrant_limits, **kwargs
+):
+    user = await get_user_by_token(request, database, rate_limiter)
+    check_registrant_limit(registrant_limits, user, "read")
+
+    try:
+        after = _decode_cursor(request.query_params.get("cursor"))
+        limit = int(
+            request.query_params.get("limit", min(1000, settings["max_page_size"]))
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail=BAD_REQUEST)
+    if not 0 < limit <= settings["max_page_size"]:
+        raise HTTPException(status_code=400, detail=BAD_REQUEST)
+
+    # One row more than the page tells whether there is a next page
+    rows = await database.get_registrant_identifiers(
+        user["registrant_id"], after=after, limit=limit + 1
+    )
+    page = rows[:limit]
+    return JSONResponse(
+        {
+            "identifiers": [row["identifier"] for row in page],
+            "next": (
+                _encode_cursor(page[-1]["identifier_id"]) if len(rows) > limit else None
+            ),
+        }
+    )
 
 
-async def nbn(request, database, **kwargs):
-    user = get_user_by_token(request, database)
+def _encode_cursor(identifier_id):
+    return base64.urlsafe_b64encode(str(identifier_id).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    """Returns the identifier_id to continue after; raises ValueError for a
+    cursor that was not made by _encode_cursor."""
+    if cursor is None:
+        return 0
+    # binascii.Error is a ValueError
+    value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    if not value.isdigit():
+        raise ValueError(cursor)
+    return int(value)
+
+
+async def nbn(request, database, rate_limiter, registrant_limits, **kwargs):
+    user = await get_user_by_token(request, database, rate_limiter)
+    check_registrant_limit(registrant_limits, user, "write")
     logger.info(f"{user['registrant_groupid']!r} requests {request.url.path!r}")
     body = await parse_body_as_json(request)
 
     identifier = body.get("identifier")
     locations = body.get("locations")
 
-    _validate_identifier_and_locations(user, identifier, locations)
+    validate_identifier_and_locations(user, identifier, locations)
 
     # Determine if identifier is resolvable (already has locations associated)
-    if database.is_resolvable_identifier(identifier):
+    if await database.is_resolvable_identifier(identifier):
         raise HTTPException(status_code=409, detail=URN_NBN_CONFLICT)
 
-    database.add_nbn_locations(identifier, locations, user)
+    await database.add_nbn_locations(identifier, locations, user)
     return PlainTextResponse(SUCCESS_CREATED_NEW, status_code=201)
 
 
-async def nbn_update(request, database, **kwargs):
-    user = get_user_by_token(request, database)
+async def nbn_update(request, database, rate_limiter, registrant_limits, **kwargs):
+    user = await get_user_by_token(request, database, rate_limiter)
+    check_registrant_limit(registrant_limits, user, "write")
     logger.info(f"{user['registrant_groupid']!r} requests {request.url.path!r}")
     body = await parse_body_as_json(request)
 
     identifier = request.path_params["identifier"]
     locations = body
 
-    _validate_identifier_and_locations(user, identifier, locations)
+    validate_identifier_and_locations(user, identifier, locations)
 
-    # Determine if identifier is resolvable (already has locations associated)
-    if database.is_resolvable_identifier(identifier):
-        database.delete_nbn_locations(identifier, user)
-        database.add_nbn_locations(identifier, locations, user)
+    # Only the changed locations are written; the result tells whether the
+    # identifier was resolvable (already had locations associated)
+    if await database.update_nbn_locations(identifier, locations, user):
         return PlainTextResponse(SUCCESS_UPDATED, status_code=200)
 
-    database.add_nbn_locations(identifier, locations, user)
     return PlainTextResponse(SUCCESS_CREATED_NEW, status_code=201)
+
+
+async def nbn_batch(
+    request, database, settings, rate_limiter, registrant_limits, **kwargs
+):
+    user = await get_user_by_token(request, database, rate_limiter)
+    logger.info(f"{user['registrant_groupid']!r} requests {request.url.path!r}")
+    body = await parse_body_as_json(request)
+
+    if not isinstance(body, list) or len(body) > settings["max_batch_size"]:
+        raise HTTPException(status_code=400, detail=BAD_REQUEST)
+    check_registrant_limit(registrant_limits, user, "write", cost=max(1, len(body)))
+
+    results, valid = check_batch_items(user, body)
+    resolvable = await database.get_resolvable_identifiers(batch_identifiers(valid))
+    if to_add := select_new_items(valid, resolvable):
+        await database.add_nbn_locations_batch(to_add, user)
+    return JSONResponse(results)
+
+
+async def nbn_stream(
+    request, database, settings, rate_limiter, registrant_limits, **kwargs
+):
+    user = await get_user_by_token(request, database, rate_limiter)
+    check_registrant_limit(registrant_limits, user, "write")
+    logger.info(f"{user['registrant_groupid']!r} requests {request.url.path!r}")
+
+    if request.headers.get("content-type") != "application/x-ndjson":
+        raise HTTPException(status_code=400, detail=BAD_REQUEST)
+
+    # The results are spooled until the body is read: most HTTP/1.1 clients
+    # only read the response after sending the body, so answering while
+    # reading it would block both once the socket buffers are full.
+    loop = asyncio.get_running_loop()
+    results = tempfile.SpooledTemporaryFile(max_size=1 << 20)
+    try:
+        batch = []
+        async for line in iter_ndjson(request.stream()):
+            batch.append(line)
+            if len(batch) == settings["stream_batch_size"]:
+                data = await _register_stream_batch(
+                    database, registrant_limits, user, batch
+                )
+                await loop.run_in_executor(None, results.write, data)
+                batch = []
+        if batch:
+            data = await _register_stream_batch(
+                database, registrant_limits, user, batch
+            )
+            await loop.run_in_executor(None, results.write, data)
+        results.seek(0)
+    except:
+        results.close()
+        raise
+    return StreamingResponse(_read_results(results), media_type="application/x-ndjson")
+
+
+async def _read_results(results):
+    try:
+        async for chunk in iterate_in_threadpool(
+            iter(functools.partial(results.read, 1 << 16), b"")
+        ):
+            yield chunk
+    finally:
+        results.close()
+
+
+async def _register_stream_batch(database, registrant_limits, user, batch):
+    """Registers a micro-batch of (line number, item) as /nbn/batch does and
+    returns the results as NDJSON. Earlier batches are registered already,
+    so a batch over the write budget gets a 429 per item."""
+    results, valid = check_batch_items(user, [item for _, item in batch])
+    if (
+        valid
+        and registrant_limits is not None
+        and registrant_limits.consume(user["registrant_groupid"], "write", len(valid))
+        is not None
+    ):
+        for result, _, _ in valid.values():
+            result.update(status=429, message=TOO_MANY_REQUESTS)
+    else:
+        resolvable = await database.get_resolvable_identifiers(batch_identifiers(valid))
+        if to_add := select_new_items(valid, resolvable):
+            await database.add_nbn_locations_batch(to_add, user)
+    return "".join(
+        json.dumps(dict(line=line_number, **result)) + "\n"
+        for (line_number, _), result in zip(batch, results)
+    ).encode("utf-8")
@@ -25,6 +25,7 @@
 ## end license ##
 
 from gmh_registration_service.test_utils import (
+    count_queries,
     environment,
     environment_session,
     insert_token,
@@ -48,6 +49,8 @@ from gmh_registration_service.utils import unfragment
 
 from urllib.parse import quote
 
+import json
+
 
 def _test_auth_for_urls(client, urls, method="get"):
     client_method = dict(get=client.get, post=client.post, put=client.put)[method]
@@ -125,6 +128,114 @@ async def test_get_nbn(environment):
     }
 
 
+async def test_get_nbn_single_query(environment, monkeypatch):
+    database = environment.database
+    TOKEN = "THE_TOKEN"
+    LTP_TOKEN = "LTP_TOKEN"
+    NBN = "urn:nbn:nl:ui:42-DEADC0FFEE"
+    registrant_id = insert_token(database, TOKEN, prefix="urn:nbn:nl:ui:42-")
+    ltp_registrant_id = insert_token(
+        database,
+        LTP_TOKEN,
+        groupid="ltp",
+        username="ltp",
+        prefix="urn:nbn:nl:ui:24-",
+        isLTP=True,
+    )
+    insert_location(
+        database,
+        identifier=NBN,
+        location="https://deadcoff.ee",
+        registrant=registrant_id,
+    )
+    insert_location(
+        database,
+        identifier="urn:nbn:nl:ui:42-LTP",
+        location="https://ltp.example.org",
+        registrant=ltp_registrant_id,
+    )
+    with database.cursor() as cursor:
+        cursor.execute(
+            "UPDATE identifier_location SET isFailover = 1 WHERE location_id = (SELECT location_id FROM location WHERE location_url = %s)",
+            ["https://ltp.example.org"],
+        )
+
+    # First requests fill the token cache
+    for token in [TOKEN, LTP_TOKEN]:
+        environment.client.get(
+            f"/nbn/{NBN}", headers={"Authorization": f"Bearer {token}"}
+        )
+
+    database.location_cache.clear()
+    queries = count_queries(monkeypatch, database)
+    response = environment.client.get(
+        f"/nbn/{NBN}", headers={"Authorization": f"Bearer {TOKEN}"}
+    )
+    assert response.status_code == 200
+    assert len(queries) == 1
+
+    del queries[:]
+    response = environment.client.get(
+        "/nbn/urn:nbn:nl:ui:42-LTP/locations",
+        headers={"Authorization": f"Bearer {LTP_TOKEN}"},
+    )
+    assert response.status_code == 200
+    assert response.json() == ["https://ltp.example.org"]
+    assert len(queries) == 1
+
+    del queries[:]
+    response = environment.client.get(
+        f"/nbn/{NBN}", headers={"Authorization": f"Bearer {LTP_TOKEN}"}
+    )
+    assert response.status_code == 403
+    assert len(queries) == 1
+
+
+async def test_get_nbn_etag(environment, monkeypatch):
+    database = environment.database
+    TOKEN = "THE_TOKEN"
+    NBN = "urn:nbn:nl:ui:42-DEADC0FFEE"
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    registrant_id = insert_token(database, TOKEN, prefix="urn:nbn:nl:ui:42-")
+    insert_location(
+        database,
+        identifier=NBN,
+        location="https://deadcoff.ee",
+        registrant=registrant_id,
+    )
+
+    response = environment.client.get(f"/nbn/{NBN}", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    # Served from cache
+    queries = count_queries(monkeypatch, database)
+    response = environment.client.get(
+        f"/nbn/{NBN}/locations", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+    assert queries == []
+
+    response = environment.client.get(
+        f"/nbn/{NBN}", headers={**headers, "If-None-Match": '"other"'}
+    )
+    assert response.status_code == 200
+
+    # Updating the locations invalidates the cache
+    response = environment.client.put(
+        f"/nbn/{NBN}", headers=headers, json=["https://deadcoff.ee/new"]
+    )
+    assert response.status_code == 200
+    response = environment.client.get(
+        f"/nbn/{NBN}", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["locations"] == ["https://deadcoff.ee/new"]
+
+
 async def test_get_nbn_locations(environment):
     _test_auth_for_urls(
         environment.client,
@@ -375,6 +486,60 @@ def test_update_nbn_create(environment):
     ]
 
 
+def test_nbn_update_writes_only_changes(environment):
+    database = environment.database
+    TOKEN = "THE_TOKEN"
+    NBN = "urn:nbn:nl:ui:42-DEADC0FFEE"
+    URL = "https://deadc0ff.ee"
+    registrant_id = insert_token(
+        database, TOKEN, prefix="urn:nbn:nl:ui:42-", isLTP=False
+    )
+
+    def stored_location_ids():
+        with database.cursor() as cursor:
+            cursor.execute(
+                "SELECT location_id FROM identifier_location ORDER BY location_id"
+            )
+            return [location_id for (location_id,) in cursor.fetchall()]
+
+    def put(locations):
+        return environment.client.put(
+            f"/nbn/{NBN}", headers={"Authorization": f"Bearer {TOKEN}"}, json=locations
+        )
+
+    assert put([URL + "/1", URL + "/2"]).status_code == 201
+    before = stored_location_ids()
+
+    # No-op re-sync
+    response = put([URL + "/1", URL + "/2"])
+    assert response.status_code == 200
+    assert response.text == SUCCESS_UPDATED
+    assert stored_location_ids() == before
+
+    # Only the location that is no longer sent is unlinked and only the new
+    # one is linked; the location that is kept keeps its link
+    assert put([URL + "/1", URL + "/3"]).status_code == 200
+    after = stored_location_ids()
+    assert after[0] == before[0]
+    assert before[1] not in after
+    assert database.get_locations(NBN, False) == [
+        {"uri": URL + "/1", "ltp": 0},
+        {"uri": URL + "/3", "ltp": 0},
+    ]
+
+    # A location that exists already keeps its lower location_id, so it is
+    # read back first; re-sending the same locations still writes nothing
+    insert_location(database, "urn:nbn:nl:ui:42-OTHER", URL + "/old", registrant_id)
+    assert put([URL + "/new", URL + "/old"]).status_code == 200
+    before = stored_location_ids()
+    assert put([URL + "/new", URL + "/old"]).status_code == 200
+    assert stored_location_ids() == before
+    assert {each["uri"] for each in database.get_locations(NBN, False)} == {
+        URL + "/new",
+        URL + "/old",
+    }
+
+
 def test_nbn_update_as_LTP(environment):
     database = environment.database
     TOKEN = "THE_TOKEN"
@@ -441,3 +606,266 @@ def test_nbn_update_non_LTP_record_as_LTP(environment):
     ]
     assert response.status_code == 200
     assert response.text == SUCCESS_UPDATED
+
+
+def test_nbn_batch(environment):
+    database = environment.database
+    TOKEN = "THE_TOKEN"
+    URL = "https://deadc0ff.ee"
+
+    _test_auth_for_urls(
+        environment.client,
+        [
+            dict(url="/nbn/batch"),
+            dict(url="/nbn/batch", headers={"Authorization": "Bearer 1234"}),
+        ],
+        method="post",
+    )
+
+    registrant_id = insert_token(
+        database, TOKEN, prefix="urn:nbn:nl:ui:42-", isLTP=False
+    )
+    insert_location(
+        database,
+        identifier="urn:nbn:nl:ui:42-EXISTS",
+        location=URL,
+        registrant=registrant_id,
+    )
+
+    response = environment.client.post(
+        "/nbn/batch",
+        headers={"Authorization": f"Bearer {TOKEN}"},
+        json={"identifier": "urn:nbn:nl:ui:42-1", "locations": [URL]},
+    )
+    assert response.status_code == 400
+    assert response.text == BAD_REQUEST
+
+    response = environment.client.post(
+        "/nbn/batch",
+        headers={"Authorization": f"Bearer {TOKEN}"},
+        json=[
+            {"identifier": "urn:nbn:nl:ui:42-1", "locations": [URL, URL + "/2"]},
+            {"identifier": "urn:nbn:nl:ui:42-2#fragment", "locations": [URL]},
+            {"identifier": "urn:nbn:nl:ui:42-1", "locations": [URL]},
+            {"identifier": "urn:nbn:nl:ui:42-EXISTS", "locations": [URL]},
+            {"identifier": "urn:nbn:nl:ui:43-1", "locations": [URL]},
+            {"identifier": "INVALID", "locations": [URL]},
+            {"identifier": "urn:nbn:nl:ui:42-3"},
+            # identifier_value is case-insensitive
+            {"identifier": "URN:NBN:NL:UI:42-exists", "locations": [URL + "/3"]},
+            {"identifier": "urn:nbn:nl:ui:42-A", "locations": [URL]},
+            {"identifier": "URN:NBN:NL:UI:42-a", "locations": [URL]},
+        ],
+    )
+    assert response.status_code == 200
+    assert [(each["identifier"], each["status"]) for each in response.json()] == [
+        ("urn:nbn:nl:ui:42-1", 201),
+        ("urn:nbn:nl:ui:42-2#fragment", 201),
+        ("urn:nbn:nl:ui:42-1", 409),
+        ("urn:nbn:nl:ui:42-EXISTS", 409),
+        ("urn:nbn:nl:ui:43-1", 403),
+        ("INVALID", 400),
+        ("urn:nbn:nl:ui:42-3", 400),
+        ("URN:NBN:NL:UI:42-exists", 409),
+        ("urn:nbn:nl:ui:42-A", 201),
+        ("URN:NBN:NL:UI:42-a", 409),
+    ]
+    assert response.json()[0]["message"] == SUCCESS_CREATED_NEW
+    assert response.json()[3]["message"] == URN_NBN_CONFLICT
+    assert response.json()[4]["message"] == URN_NBN_FORBIDDEN2
+
+    assert database.get_locations("urn:nbn:nl:ui:42-1", False) == [
+        {"uri": URL, "ltp": 0},
+        {"uri": URL + "/2", "ltp": 0},
+    ]
+    assert database.get_locations("urn:nbn:nl:ui:42-2", False) == [
+        {"uri": URL, "ltp": 0}
+    ]
+    assert database.get_locations("urn:nbn:nl:ui:42-EXISTS", False) == [
+        {"uri": URL, "ltp": 0}
+    ]
+    assert database.get_locations("urn:nbn:nl:ui:42-a", False) == [
+        {"uri": URL, "ltp": 0}
+    ]
+
+
+def test_nbn_stream(environment):
+    database = environment.database
+    TOKEN = "THE_TOKEN"
+    URL = "https://deadc0ff.ee"
+    headers = {
+        "Authorization": f"Bearer {TOKEN}",
+        "Content-Type": "application/x-ndjson",
+    }
+
+    _test_auth_for_urls(environment.client, [dict(url="/nbn/stream")], method="post")
+
+    registrant_id = insert_token(
+        database, TOKEN, prefix="urn:nbn:nl:ui:42-", isLTP=False
+    )
+    insert_location(
+        database,
+        identifier="urn:nbn:nl:ui:42-EXISTS",
+        location=URL,
+        registrant=registrant_id,
+    )
+
+    response = environment.client.post(
+        "/nbn/stream",
+        headers={"Authorization": f"Bearer {TOKEN}"},
+        json=[{"identifier": "urn:nbn:nl:ui:42-1", "locations": [URL]}],
+    )
+    assert response.status_code == 400
+    assert response.text == BAD_REQUEST
+
+    lines = [
+        json.dumps({"identifier": "urn:nbn:nl:ui:42-1", "locations": [URL]}),
+        "",
+        json.dumps({"identifier": "urn:nbn:nl:ui:42-EXISTS", "locations": [URL]}),
+        "not json",
+        json.dumps({"identifier": "urn:nbn:nl:ui:43-1", "locations": [URL]}),
+        json.dumps({"identifier": "urn:nbn:nl:ui:42-1", "locations": [URL]}),
+    ]
+    response = environment.client.post(
+        "/nbn/stream", headers=headers, content="\n".join(lines)
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [(each["line"], each["status"]) for each in results] == [
+        (1, 201),
+        (3, 409),
+        (4, 400),
+        (5, 403),
+        (6, 409),
+    ]
+    assert results[0]["message"] == SUCCESS_CREATED_NEW
+    assert results[2]["identifier"] is None
+    assert database.get_locations("urn:nbn:nl:ui:42-1", False) == [
+        {"uri": URL, "ltp": 0}
+    ]
+
+
+def test_nbn_list(environment):
+    database = environment.database
+    TOKEN = "THE_TOKEN"
+    URL = "https://deadc0ff.ee"
+
+    _test_auth_for_urls(environment.client, [dict(url="/nbn")])
+
+    registrant_id = insert_token(database, TOKEN, prefix="urn:nbn:nl:ui:42-")
+    other_id = insert_token(
+        database, "OTHER", groupid="OTHER", username="alice", prefix="urn:nbn:nl:ui:43-"
+    )
+    for n in range(5):
+        insert_location(database, f"urn:nbn:nl:ui:42-{n}", f"{URL}/{n}", registrant_id)
+    insert_location(database, "urn:nbn:nl:ui:43-1", URL, other_id)
+
+    identifiers = []
+    url = "/nbn?limit=2"
+    while url is not None:
+        response = environment.client.get(
+            url, headers={"Authorization": f"Bearer {TOKEN}"}
+        )
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["identifiers"]) <= 2
+        identifiers.extend(page["identifiers"])
+        url = page["next"] and f"/nbn?limit=2&cursor={page['next']}"
+    assert identifiers == [f"urn:nbn:nl:ui:42-{n}" for n in range(5)]
+
+    for url in ["/nbn?limit=0", "/nbn?limit=x", "/nbn?cursor=x", "/nbn?limit=100000"]:
+        response = environment.client.get(
+            url, headers={"Authorization": f"Bearer {TOKEN}"}
+        )
+        assert response.status_code == 400
+        assert response.text == BAD_REQUEST
+
+
+def test_nbn_lookup(environment):
+    database = environment.database
+    TOKEN = "THE_TOKEN"
+    LTP_TOKEN = "LTP_TOKEN"
+    URL = "https://deadc0ff.ee"
+
+    _test_auth_for_urls(
+        environment.client,
+        [
+            dict(url="/nbn/lookup"),
+            dict(url="/nbn/lookup", headers={"Authorization": "Bearer 1234"}),
+        ],
+        method="post",
+    )
+
+    registrant_id = insert_token(database, TOKEN, prefix="urn:nbn:nl:ui:42-")
+    ltp_registrant_id = insert_token(
+        database,
+        LTP_TOKEN,
+        groupid="ltp",
+        username="ltp",
+        prefix="urn:nbn:nl:ui:24-",
+        isLTP=True,
+    )
+    insert_location(
+        database,
+        identifier="urn:nbn:nl:ui:42-1",
+        location=URL,
+        registrant=registrant_id,
+    )
+    insert_location(
+        database,
+        identifier="urn:nbn:nl:ui:43-1",
+        location=URL + "/other",
+        registrant=registrant_id,
+    )
+
+    response = environment.client.post(
+        "/nbn/lookup",
+        headers={"Authorization": f"Bearer {TOKEN}"},
+        json="urn:nbn:nl:ui:42-1",
+    )
+    assert response.status_code == 400
+    assert response.text == BAD_REQUEST
+
+    response = environment.client.post(
+        "/nbn/lookup",
+        headers={"Authorization": f"Bearer {TOKEN}"},
+        json=[
+            "urn:nbn:nl:ui:42-1",
+            "urn:nbn:nl:ui:42-1#fragment",
+            "URN:NBN:NL:UI:42-1",
+            "urn:nbn:nl:ui:42-2",
+            "urn:nbn:nl:ui:43-1",
+            "INVALID",
+        ],
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "locations": {
+            "urn:nbn:nl:ui:42-1": [URL],
+            "urn:nbn:nl:ui:42-1#fragment": [URL],
+            "URN:NBN:NL:UI:42-1": [URL],
+        },
+        "not_found": ["urn:nbn:nl:ui:42-2"],
+        "forbidden": ["urn:nbn:nl:ui:43-1"],
+        "invalid": ["INVALID"],
+    }
+
+    # LTP user only sees identifiers with its own LTP locations
+    response = environment.client.put(
+        "/nbn/urn:nbn:nl:ui:42-1",
+        headers={"Authorization": f"Bearer {LTP_TOKEN}"},
+        json=[URL + "/ltp"],
+    )
+    assert response.status_code == 200
+    response = environment.client.post(
+        "/nbn/lookup",
+        headers={"Authorization": f"Bearer {LTP_TOKEN}"},
+        json=["URN:NBN:NL:UI:42-1", "urn:nbn:nl:ui:43-1"],
+    )
+    assert response.json() == {
+        "locations": {"URN:NBN:NL:UI:42-1": [URL, URL + "/ltp"]},
+        "not_found": [],
+        "forbidden": ["urn:nbn:nl:ui:43-1"],
+        "invalid": [],
+    }
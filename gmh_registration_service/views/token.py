@@ -31,9 +31,12 @@ import secrets
 import base64
 
 from gmh_registration_service.messages import (
+    BAD_REQUEST,
     INTERNAL_ERROR,
     INVALID_CREDENTIALS,
+    SERVICE_UNAVAILABLE,
 )
+from gmh_registration_service.passwords import PasswordHasherBusy
 from gmh_registration_service.utils import parse_body_as_json
 
 import logging
@@ -45,16 +48,28 @@ def random_token(size=48):
     return base64.b64encode(secrets.token_bytes(size))
 
 
-async def token(request, database, **kwargs):
+async def token(request, database, password_hasher, settings, **kwargs):
     user_credentials = await parse_body_as_json(request)
 
     username = user_credentials.get("username")
     password = user_credentials.get("password")
+    signed = user_credentials.get("token_type", "opaque") == "signed"
+
+    if signed and database.token_signer is None:
+        raise HTTPException(status_code=400, detail=BAD_REQUEST)
 
     try:
-        new_token = _new_token(database, username, password)
+        new_token = await _new_token(
+            database, password_hasher, username, password, signed
+        )
     except HTTPException:
         raise
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=503,
+            detail=SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(settings["retry_after"])},
+        )
     except Exception:
         logging.exception("token")
         raise HTTPException(status_code=500, detail=INTERNAL_ERROR)
@@ -62,13 +77,22 @@ async def token(request, database, **kwargs):
     return PlainTextResponse(content=new_token, status_code=200)
 
 
-def _new_token(database, username, password):
+async def _new_token(database, password_hasher, username, password, signed=False):
     if (
-        credentials_id := database.validate_user_credentials(username, password)
-    ) is None:
+        password is None
+        or (credentials := await database.get_credentials_by_username(username)) is None
+        or not await password_hasher.check(password, credentials["password"])
+    ):
         raise HTTPException(status_code=403, detail=INVALID_CREDENTIALS)
 
+    # A new token, signed or not, replaces the previous ones
     new_token = random_token()
-    database.update_token(new_token, credentials_id)
+    await database.update_token(new_token, credentials["credentials_id"])
+    if database.token_signer is not None:
+        database.token_signer.revoke(credentials["credentials_id"])
+
+    if signed:
+        user = await database.get_user_by_credentials_id(credentials["credentials_id"])
+        new_token = database.token_signer.sign(user)
 
     return new_token
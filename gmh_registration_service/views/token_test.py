@@ -25,6 +25,7 @@
 ## end license ##
 
 from gmh_registration_service.test_utils import (
+    count_queries,
     environment_session,
     environment,
     insert_token,
@@ -36,6 +37,7 @@ from gmh_registration_service.messages import (
 )
 
 from .token import random_token
+from ..tokens import TokenSigner
 
 
 async def test_random_token():
@@ -43,7 +45,7 @@ async def test_random_token():
 
 
 async def test_supported_method(environment):
-    client, _, _, _ = environment
+    client, _, _, _, _, _ = environment
     response = client.get("/token")
     assert response.status_code == 405
 
@@ -53,7 +55,7 @@ async def test_supported_method(environment):
 
 
 async def test_get_token(environment):
-    client, _, _, database = environment
+    client, _, _, database, _, _ = environment
 
     response = client.post("/token", json={"username": "Bob", "password": "Secret"})
     assert response.status_code == 403
@@ -69,8 +71,80 @@ async def test_get_token(environment):
     assert len(response.text) == 64
 
 
+async def test_new_token_invalidates_cached_token(environment):
+    client, _, _, database, _, _ = environment
+    insert_token(database, token="OLD_TOKEN")
+
+    response = client.get("/location/x", headers={"Authorization": "Bearer OLD_TOKEN"})
+    assert response.status_code == 404
+    assert database.token_cache.get("OLD_TOKEN") is not None
+
+    response = client.post("/token", json={"username": "bob", "password": "Secret"})
+    assert response.status_code == 200
+    new_token = response.text
+
+    response = client.get("/location/x", headers={"Authorization": "Bearer OLD_TOKEN"})
+    assert response.status_code == 401
+    response = client.get(
+        "/location/x", headers={"Authorization": f"Bearer {new_token}"}
+    )
+    assert response.status_code == 404
+
+
+async def test_signed_token(environment, monkeypatch):
+    client, _, _, database, _, _ = environment
+    insert_token(database, token="OPAQUE_TOKEN", prefix="urn:nbn:nl:ui:42-")
+
+    credentials = {"username": "bob", "password": "Secret", "token_type": "signed"}
+    response = client.post("/token", json=credentials)
+    assert response.status_code == 400
+
+    monkeypatch.setattr(database, "token_signer", TokenSigner("secret"))
+    response = client.post("/token", json=credentials)
+    assert response.status_code == 200
+    signed_token = response.text
+    assert signed_token.startswith("v1.")
+
+    queries = []
+    monkeypatch.setattr(
+        database, "select_query", lambda *args, **kwargs: queries.append(args) or []
+    )
+    response = client.get(
+        "/nbn/urn:nbn:nl:ui:43-1", headers={"Authorization": f"Bearer {signed_token}"}
+    )
+    assert response.status_code == 403
+    # Only the location lookup, no query for the token
+    assert len(queries) == 1
+    monkeypatch.undo()
+
+    response = client.get(
+        "/location/x", headers={"Authorization": "Bearer OPAQUE_TOKEN"}
+    )
+    assert response.status_code == 401
+
+
+async def test_unknown_token_is_cached(environment, monkeypatch):
+    client, _, _, database, _, _ = environment
+    queries = count_queries(monkeypatch, database)
+    for _ in range(3):
+        response = client.get(
+            "/location/x", headers={"Authorization": "Bearer STALE_TOKEN"}
+        )
+        assert response.status_code == 401
+    assert len(queries) == 1
+
+    # Issuing the token makes it valid right away
+    insert_token(database, "OTHER_TOKEN")
+    user = database.get_user_by_token("OTHER_TOKEN")
+    database.update_token("STALE_TOKEN", user["credentials_id"])
+    response = client.get(
+        "/location/x", headers={"Authorization": "Bearer STALE_TOKEN"}
+    )
+    assert response.status_code == 404
+
+
 async def test_internal_server_error(environment):
-    client, _, _, database = environment
+    client, _, _, database, _, _ = environment
 
     database.select_query = None
 
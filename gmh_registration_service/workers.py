@@ -0,0 +1,247 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import asyncio
+import logging
+import multiprocessing
+import random
+import signal
+import socket
+import threading
+import time
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+
+def bind_socket(host, port, reuse_port=False):
+    sock = socket.socket(
+        socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM
+    )
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def new_event_loop(loop="auto"):
+    if loop != "asyncio":
+        try:
+            import uvloop
+
+            return uvloop.new_event_loop()
+        except ImportError:
+            if loop == "uvloop":
+                raise
+    return asyncio.new_event_loop()
+
+
+async def serve(create_app, config, sock, http="auto", max_requests=None):
+    """Serves the app created by create_app(config=config) on sock. Every
+    worker creates its own app, and with it its own database pool."""
+    app = await create_app(config=config)
+    server = uvicorn.Server(
+        uvicorn.Config(
+            app,
+            http=http,
+            proxy_headers=bool(config.deproxy_ips),
+            forwarded_allow_ips=config.deproxy_ips or None,
+            limit_max_requests=max_requests,
+            timeout_graceful_shutdown=30,
+            log_config=None,
+        )
+    )
+    await server.serve(sockets=[sock])
+
+
+def _worker(
+    create_app,
+    config,
+    sock,
+    address,
+    loop,
+    http,
+    max_requests,
+    initializer,
+    initargs,
+):
+    if initializer is not None:
+        initializer(*initargs)
+    if sock is None:
+        sock = bind_socket(*address, reuse_port=True)
+    event_loop = new_event_loop(loop)
+    try:
+        event_loop.run_until_complete(
+            serve(create_app, config, sock, http=http, max_requests=max_requests)
+        )
+    finally:
+        event_loop.close()
+
+
+class Supervisor:
+    """Pre-forks `workers` server processes and replaces those that exit,
+    either because they served `max_requests` requests (recycling, with
+    up to 10% jitter so workers do not restart all at once) or crashed.
+    A worker that crashes before it has run for `max_backoff` seconds is
+    restarted after an exponential backoff, starting at `backoff` seconds,
+    so that a failing startup (e.g. the database is down) does not become
+    a tight spawn loop.
+
+    Every worker has its own caches, rate limit buckets and signed token
+    revocations: see Config.share_between_workers for what that means.
+
+    Without `reuse_port` the workers accept from one socket bound here;
+    with it every worker binds host:port with SO_REUSEPORT and the kernel
+    balances connections over them."""
+
+    def __init__(
+        self,
+        create_app,
+        config,
+        host,
+        port,
+        workers,
+        reuse_port=False,
+        loop="auto",
+        http="auto",
+        max_requests=None,
+        initializer=None,
+        initargs=(),
+        backoff=0.5,
+        max_backoff=30,
+    ):
+        self.create_app = create_app
+        self.config = config
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.loop = loop
+        self.http = http
+        self.max_requests = max_requests
+        self.initializer = initializer
+        self.initargs = initargs
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # With SO_REUSEPORT a listening socket here would get its share of
+        # the connections without ever accepting them
+        self.socket = None if reuse_port else bind_socket(host, port)
+        self.address = (host, port) if reuse_port else self.socket.getsockname()[:2]
+        self.processes = []
+        self.restarts = 0
+        self._started = [0.0] * workers
+        self._failures = [0] * workers
+        self._respawn_at = [None] * workers
+        self.should_exit = threading.Event()
+        self._context = multiprocessing.get_context("spawn")
+
+    def _spawn(self):
+        max_requests = self.max_requests
+        if max_requests:
+            max_requests += random.randint(0, max_requests // 10)
+        process = self._context.Process(
+            target=_worker,
+            args=(
+                self.create_app,
+                self.config,
+                self.socket,
+                self.address,
+                self.loop,
+                self.http,
+                max_requests,
+                self.initializer,
+                self.initargs,
+            ),
+            name="gmh-worker",
+        )
+        process.start()
+        return process
+
+    def _backoff(self, i, process, now):
+        """Returns the delay before the worker in slot i is restarted."""
+        if process.exitcode == 0 or now - self._started[i] >= self.max_backoff:
+            self._failures[i] = 0
+            return 0
+        delay = min(self.max_backoff, self.backoff * 2 ** self._failures[i])
+        self._failures[i] += 1
+        return delay
+
+    def run(self):
+        self.processes = [self._spawn() for _ in range(self.workers)]
+        self._started = [time.monotonic()] * self.workers
+        logger.info(f"Started {self.workers} workers on {self.address}")
+        try:
+            while not self.should_exit.wait(0.5):
+                now = time.monotonic()
+                for i, process in enumerate(self.processes):
+                    if process.is_alive():
+                        continue
+                    if self._respawn_at[i] is None:
+                        delay = self._backoff(i, process, now)
+                        self._respawn_at[i] = now + delay
+                        if process.exitcode == 0:
+                            logger.info(f"Worker {process.pid} exited, restarting")
+                        else:
+                            logger.warning(
+                                f"Worker {process.pid} died with {process.exitcode}, "
+                                f"restarting in {delay:.1f}s"
+                            )
+                    if now < self._respawn_at[i]:
+                        continue
+                    self.restarts += 1
+                    self._respawn_at[i] = None
+                    self._started[i] = now
+                    self.processes[i] = self._spawn()
+        finally:
+            self.stop()
+
+    def stop(self, timeout=35):
+        self.should_exit.set()
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {process.pid} did not stop, killing")
+                process.kill()
+                process.join()
+        if self.socket is not None:
+            self.socket.close()
+
+
+def run_workers(*args, **kwargs):
+    supervisor = Supervisor(*args, **kwargs)
+
+    def handle_exit(signum, frame):
+        supervisor.should_exit.set()
+
+    signal.signal(signal.SIGINT, handle_exit)
+    signal.signal(signal.SIGTERM, handle_exit)
+    supervisor.run()
@@ -0,0 +1,94 @@
+## begin license ##
+#
+# Gemeenschappelijke Metadata Harvester (GMH) Registration Service
+#  register NBN and urls
+#
+# Copyright (C) 2025 Koninklijke Bibliotheek (KB) https://www.kb.nl
+# Copyright (C) 2025 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "GMH-Registration-Service"
+#
+# "GMH-Registration-Service" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "GMH-Registration-Service" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "GMH-Registration-Service"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+import os
+import threading
+import time
+import types
+
+import httpx
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from .workers import Supervisor
+
+
+class Config:
+    deproxy_ips = []
+
+
+async def create_app(config, **_):
+    async def pid(request):
+        return PlainTextResponse(str(os.getpid()))
+
+    return Starlette(routes=[Route("/", endpoint=pid)])
+
+
+def _get(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return httpx.get(url, headers={"Connection": "close"}).text
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def test_workers_are_recycled():
+    supervisor = Supervisor(
+        create_app, Config(), "127.0.0.1", 0, workers=2, max_requests=2
+    )
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    try:
+        host, port = supervisor.address
+        pids = set(_get(f"http://{host}:{port}/") for _ in range(10))
+        # Workers are replaced after serving (about) 2 requests
+        assert len(pids) > 2
+        assert supervisor.restarts > 0
+    finally:
+        supervisor.should_exit.set()
+        thread.join()
+    assert all(not process.is_alive() for process in supervisor.processes)
+
+
+def test_crashing_workers_back_off():
+    supervisor = Supervisor(
+        create_app, Config(), "127.0.0.1", 0, workers=1, backoff=0.5, max_backoff=4
+    )
+    crashed = types.SimpleNamespace(exitcode=1)
+    delays = [supervisor._backoff(0, crashed, now=1) for _ in range(5)]
+    assert delays == [0.5, 1, 2, 4, 4]
+    # A worker that ran for max_backoff seconds, or was recycled, restarts at once
+    assert supervisor._backoff(0, crashed, now=10) == 0
+    supervisor._started[0] = 10
+    assert supervisor._backoff(0, crashed, now=11) == 0.5
+    assert supervisor._backoff(0, types.SimpleNamespace(exitcode=0), now=11) == 0
+    assert supervisor._backoff(0, crashed, now=11) == 0.5
+    supervisor.stop()